@@ -1,28 +1,365 @@
+import os
+import time
+import queue
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict, deque
+
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from statsmodels.tsa.arima.model import ARIMA
 
+from perf import timed, cache_event
+from pools import pool_context
+
+@timed()
 def zscore_anomalies(series: pd.Series, threshold: float = 2.5):
-    vals = series.fillna(0).values.reshape(-1, 1)
-    scaler = StandardScaler()
-    z = scaler.fit_transform(vals).flatten()
+    vals = series.fillna(0).to_numpy(dtype=float)
+    z = anomaly_scores(vals[np.newaxis, :], method='zscore')[0]
     anomalies_idx = np.where(np.abs(z) >= threshold)[0]
     return anomalies_idx, z
 
+
+def _safe_divide(num, den):
+    """num / den, with 0 where den is 0 (a flat series has no anomalies)"""
+    out = np.zeros(np.broadcast(num, den).shape, dtype=float)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def anomaly_scores(values: np.ndarray, method: str = 'zscore', window: int = 28, min_periods: int = None):
+    """
+    Score every point of a 2-D (series x date) array in one vectorised pass.
+    'zscore' uses each series' mean and population std, 'robust' its median
+    and MAD (or mean absolute deviation when the MAD is 0), 'rolling' the
+    mean and std of the previous ``window`` points, scoring 0 until
+    ``min_periods`` (default ``window``) of them exist.
+    """
+    values = np.asarray(values, dtype=float)
+    if method == 'zscore':
+        mean = values.mean(axis=1, keepdims=True)
+        std = values.std(axis=1, keepdims=True)
+        return _safe_divide(values - mean, std)
+    if method == 'robust':
+        median = np.median(values, axis=1, keepdims=True)
+        deviation = np.abs(values - median)
+        # 0.6745 / MAD; a zero-heavy series has MAD 0, so fall back to the
+        # mean absolute deviation scaled to the same std-equivalent units
+        scale = np.median(deviation, axis=1, keepdims=True) / 0.6745
+        scale = np.where(scale > 0, scale, 1.2533 * deviation.mean(axis=1, keepdims=True))
+        return _safe_divide(values - median, scale)
+    if method == 'rolling':
+        n_series, n_dates = values.shape
+        csum = np.zeros((n_series, n_dates + 1))
+        csum2 = np.zeros((n_series, n_dates + 1))
+        np.cumsum(values, axis=1, out=csum[:, 1:])
+        np.cumsum(values ** 2, axis=1, out=csum2[:, 1:])
+        end = np.arange(n_dates)
+        start = np.maximum(end - window, 0)
+        count = (end - start).astype(float)
+        total = csum[:, end] - csum[:, start]
+        total2 = csum2[:, end] - csum2[:, start]
+        mean = _safe_divide(total, count)
+        var = np.maximum(_safe_divide(total2, count) - mean ** 2, 0)
+        scores = _safe_divide(values - mean, np.sqrt(var))
+        # Too little history to judge the first points
+        scores[:, count < max(min_periods or window, 2)] = 0
+        return scores
+    raise ValueError(f"Unknown anomaly method: {method}")
+
+
+def _key_codes(panel: pd.DataFrame, key_cols):
+    """
+    Row codes of each distinct key combination and a frame of the keys.
+    Per-column codes (categorical codes where available) are combined into
+    one integer, so only a single int64 column is factorized.
+    """
+    combined = np.zeros(len(panel), dtype=np.int64)
+    levels = []
+    for col in key_cols:
+        if isinstance(panel[col].dtype, pd.CategoricalDtype):
+            codes, uniques = panel[col].cat.codes.to_numpy(), panel[col].cat.categories
+        else:
+            codes, uniques = pd.factorize(panel[col])
+        combined = combined * len(uniques) + codes
+        levels.append(uniques)
+    key_codes, combos = pd.factorize(combined)
+    keys = {}
+    for col, uniques in zip(reversed(key_cols), reversed(levels)):
+        combos, codes = np.divmod(combos, len(uniques))
+        keys[col] = uniques.take(codes)
+        if isinstance(panel[col].dtype, pd.CategoricalDtype):
+            keys[col] = pd.Categorical(keys[col], dtype=panel[col].dtype)
+    return key_codes, pd.DataFrame({col: keys[col] for col in key_cols})
+
+
+def panel_matrix(panel: pd.DataFrame, key_cols, value_col: str):
+    """
+    Pivot a long panel into a dense (series x date) array.
+    Returns the array, a frame of series keys (one row per array row) and
+    the sorted dates; missing days are 0.
+    """
+    key_cols = [key_cols] if isinstance(key_cols, str) else list(key_cols)
+    panel = panel.dropna(subset=['date'] + key_cols)
+    key_codes, keys = _key_codes(panel, key_cols)
+    date_codes, dates = pd.factorize(panel['date'], sort=True)
+    flat = key_codes * len(dates) + date_codes
+    values = np.bincount(flat, weights=panel[value_col].to_numpy(dtype=float),
+                         minlength=len(keys) * len(dates)).reshape(len(keys), len(dates))
+    return values, keys, pd.DatetimeIndex(dates)
+
+
+@timed()
+def panel_anomalies(panel: pd.DataFrame, key_cols, value_col: str, threshold: float = 2.5,
+                    method: str = 'zscore', window: int = 28, min_periods: int = None):
+    """Sparse table of (series key, date, value, score) for every flagged point of a panel"""
+    key_cols = [key_cols] if isinstance(key_cols, str) else list(key_cols)
+    values, keys, dates = panel_matrix(panel, key_cols, value_col)
+    scores = anomaly_scores(values, method=method, window=window, min_periods=min_periods)
+    rows, cols = np.nonzero(np.abs(scores) >= threshold)
+    out = keys.iloc[rows].reset_index(drop=True)
+    out['date'] = dates.take(cols)
+    out['value'] = values[rows, cols]
+    out['score'] = scores[rows, cols]
+    return out
+
+@timed()
 def moving_average(series: pd.Series, window: int = 7):
     return series.rolling(window=window, min_periods=1).mean()
 
-def arima_forecast(ts_df: pd.DataFrame, value_col: str, steps: int = 7):
-    ts_df = ts_df.dropna(subset=[value_col]).copy().sort_values('date')
-    series = ts_df[value_col].astype(float)
+
+@timed()
+def daily_trend(ts: pd.DataFrame, value_col: str, window: int = 7, threshold: float = 2.5):
+    """Daily series with moving average, z-score and anomaly flag columns"""
+    ts = ts.copy()
+    ts['ma'] = moving_average(ts[value_col], window=window)
+    anomalies_idx, z = zscore_anomalies(ts[value_col], threshold=threshold)
+    ts['z'] = z
+    ts['is_anomaly'] = False
+    ts.loc[ts.index[anomalies_idx], 'is_anomaly'] = True
+    return ts
+
+ARIMA_ORDER = (1, 1, 1)
+
+
+def _future_dates(last_date, steps: int):
+    return pd.date_range(last_date, periods=steps+1, freq='D')[1:]
+
+
+def _fallback_forecast(values, steps: int):
+    last_val = values[-1] if len(values) else 0
+    return np.full(steps, last_val, dtype=float)
+
+
+def _fit_arima(values, order=ARIMA_ORDER):
     try:
-        model = ARIMA(series, order=(1,1,1))
-        fit = model.fit()
-        forecast = fit.forecast(steps=steps)
-        future_dates = pd.date_range(ts_df['date'].max(), periods=steps+1, freq='D')[1:]
-        return pd.DataFrame({'date': future_dates, 'forecast': forecast})
+        model = ARIMA(values, order=order)
+        return model.fit()
     except Exception:
-        last_val = series.iloc[-1] if len(series) else 0
-        future_dates = pd.date_range(ts_df['date'].max(), periods=steps+1, freq='D')[1:]
-        return pd.DataFrame({'date': future_dates, 'forecast': [last_val]*steps})
+        return None
+
+
+class ForecastModelCache:
+    """
+    Fitted ARIMA results keyed on a fingerprint of the series and order.
+    A new horizon reuses the cached fit; a series that extends a cached one
+    is updated with the previous parameters instead of re-estimated, with a
+    full refit once ``refit_every`` observations have been appended.
+    """
+
+    def __init__(self, max_entries: int = 32, refit_every: int = 30):
+        self.max_entries = max_entries
+        self.refit_every = refit_every
+        self._fits = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.extends = self.misses = 0
+
+    @staticmethod
+    def fingerprint(values, order):
+        digest = hashlib.sha1(np.ascontiguousarray(values, dtype=float).tobytes())
+        digest.update(repr(tuple(order)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _find_prefix(self, values, order):
+        for key, (cached_values, cached_order, fit, appended) in reversed(self._fits.items()):
+            n = len(cached_values)
+            if cached_order == order and fit is not None and n < len(values) \
+                    and np.array_equal(values[:n], cached_values):
+                return key, cached_values, fit, appended
+        return None
+
+    def get_fit(self, values, order=ARIMA_ORDER):
+        """Fitted results for ``values`` (None when ARIMA cannot be fitted)"""
+        values = np.asarray(values, dtype=float)
+        order = tuple(order)
+        key = self.fingerprint(values, order)
+        with self._lock:
+            if key in self._fits:
+                self._fits.move_to_end(key)
+                self.hits += 1
+                cache_event('forecast_model', True)
+                return self._fits[key][2]
+            prefix = self._find_prefix(values, order)
+
+        fit, appended = None, 0
+        if prefix is not None:
+            _, cached_values, cached_fit, appended = prefix
+            appended += len(values) - len(cached_values)
+            if appended < self.refit_every:
+                try:
+                    fit = cached_fit.append(values[len(cached_values):], refit=False)
+                    self.extends += 1
+                    cache_event('forecast_model', True)
+                except Exception:
+                    fit = None
+        if fit is None:
+            fit, appended = _fit_arima(values, order), 0
+            self.misses += 1
+            cache_event('forecast_model', False)
+
+        with self._lock:
+            self._fits[key] = (values, order, fit, appended)
+            while len(self._fits) > self.max_entries:
+                self._fits.popitem(last=False)
+        return fit
+
+
+FORECAST_CACHE = ForecastModelCache()
+
+
+def _fit_forecast(values, steps: int, order=ARIMA_ORDER, cache=None):
+    fit = cache.get_fit(values, order) if cache is not None else _fit_arima(values, order)
+    if fit is None:
+        return _fallback_forecast(values, steps)
+    try:
+        return np.asarray(fit.forecast(steps=steps), dtype=float)
+    except Exception:
+        return _fallback_forecast(values, steps)
+
+
+@timed()
+def arima_forecast(ts_df: pd.DataFrame, value_col: str, steps: int = 7, cache=FORECAST_CACHE):
+    ts_df = ts_df.dropna(subset=[value_col]).copy().sort_values('date')
+    series = ts_df[value_col].astype(float).to_numpy()
+    forecast = _fit_forecast(series, steps, cache=cache)
+    future_dates = _future_dates(ts_df['date'].max(), steps)
+    return pd.DataFrame({'date': future_dates, 'forecast': forecast})
+
+
+def _batch_worker(values, steps, order):
+    # Convergence warnings from hundreds of fits would flood the logs
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return _fit_forecast(values, steps, order)
+
+
+# Worker start-up (imports) does not count toward a fit's timeout, up to this long
+POOL_STARTUP_SECONDS = 60.0
+_started = None
+
+
+def _init_pool_worker(started):
+    global _started
+    _started = started
+
+
+def _pool_worker(generation, i, values, steps, order):
+    _started.put((generation, i))
+    return _batch_worker(values, steps, order)
+
+
+def _pool_forecasts(series, steps: int, order, workers: int, timeout: float):
+    """
+    Fit each (key, last_date, values) series on a process pool with at most
+    one fit per worker in flight. Each fit's deadline counts from when a
+    worker picks it up. Overrunning workers count as stuck; once all are,
+    the pool is terminated and replaced, and it is always terminated at the
+    end so no stray fit keeps a core busy.
+    """
+    context = pool_context()
+    started = context.SimpleQueue()
+    workers = max(min(workers, len(series)), 1)
+    done = queue.Queue()
+    forecasts = [None] * len(series)
+    pending = deque(range(len(series)))
+    running = {}
+    stuck = generation = 0
+    pool = context.Pool(workers, initializer=_init_pool_worker, initargs=(started,))
+    try:
+        while pending or running:
+            if stuck >= workers:
+                pool.terminate()
+                pool = context.Pool(workers, initializer=_init_pool_worker, initargs=(started,))
+                stuck, generation = 0, generation + 1
+            while pending and len(running) + stuck < workers:
+                i = pending.popleft()
+                pool.apply_async(_pool_worker, (generation, i, series[i][2], steps, order),
+                                 callback=lambda r, i=i, g=generation: done.put((g, i, r, None)),
+                                 error_callback=lambda e, i=i, g=generation: done.put((g, i, None, e)))
+                running[i] = time.monotonic() + timeout + POOL_STARTUP_SECONDS
+            while not started.empty():
+                g, i = started.get()
+                if g == generation and i in running:
+                    running[i] = time.monotonic() + timeout
+            try:
+                # Short waits so start notices are picked up promptly
+                wait = min(min(running.values()) - time.monotonic(), 0.1)
+                g, i, result, error = done.get(timeout=max(wait, 0))
+            except queue.Empty:
+                now = time.monotonic()
+                for i in [i for i, deadline in running.items() if deadline <= now]:
+                    del running[i]
+                    stuck += 1
+                    print(f"❌ Forecast for {series[i][0]} timed out, using last value")
+                    forecasts[i] = _fallback_forecast(series[i][2], steps)
+                continue
+            if g != generation:
+                continue
+            if i not in running:
+                # A timed-out fit finished after all; its worker is free again
+                stuck -= 1
+                continue
+            del running[i]
+            if error is not None:
+                print(f"❌ Forecast for {series[i][0]} failed ({type(error).__name__}), using last value")
+                result = _fallback_forecast(series[i][2], steps)
+            forecasts[i] = result
+    finally:
+        pool.terminate()
+        pool.join()
+    return forecasts
+
+
+@timed()
+def batch_forecast(panel: pd.DataFrame, key_cols, value_col: str, steps: int = 7, order=ARIMA_ORDER,
+                   max_workers=None, timeout: float = 30.0):
+    """
+    Forecast every series of a long panel (e.g. state x date) across a process pool.
+    A series whose fit fails, or does not finish within ``timeout`` seconds
+    of a worker starting it, falls back to its last value. With
+    ``max_workers=1`` or a single series the fits run in-process, where
+    they cannot be interrupted, so ``timeout`` does not apply. Returns one
+    tidy frame with the key columns, date and forecast.
+    """
+    key_cols = [key_cols] if isinstance(key_cols, str) else list(key_cols)
+    panel = panel.dropna(subset=[value_col]).sort_values(key_cols + ['date'])
+    series = [
+        (key if isinstance(key, tuple) else (key,), group['date'].max(), group[value_col].to_numpy(dtype=float))
+        for key, group in panel.groupby(key_cols, observed=True, sort=False)
+    ]
+
+    if max_workers == 1 or len(series) <= 1:
+        forecasts = [_batch_worker(values, steps, order) for _, _, values in series]
+    else:
+        forecasts = _pool_forecasts(series, steps, order, max_workers or os.cpu_count() or 1, timeout)
+
+    frames = []
+    for (key, last_date, _), forecast in zip(series, forecasts):
+        frame = pd.DataFrame({'date': _future_dates(last_date, steps), 'forecast': forecast})
+        for col, value in zip(key_cols, key):
+            frame[col] = value
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=key_cols + ['date', 'forecast'])
+    return pd.concat(frames, ignore_index=True)[key_cols + ['date', 'forecast']]
@@ -1,13 +1,22 @@
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
 from io import BytesIO
 
-from preprocess import load_dataset
-from utils import inject_css, kpi_row, cache_df
-from analytics import zscore_anomalies, moving_average, arima_forecast
-from geo import load_geojson, map_state_names, get_geojson_property_key
+from preprocess import (load_dataset, dataset_version, filter_frame, aggregate_frame, load_aggregates, source_bytes,
+                        DEFAULT_PATHS, METRIC_COLS, CHUNKED_MIN_BYTES)
+from utils import inject_css, kpi_row, show_chart, perf_panel, background_panel
+from cube import AggregateCube
+from export import export_frame, FileReader, EXPORT_FORMATS
+from analytics import daily_trend, arima_forecast, batch_forecast, panel_anomalies
+from charts import (trend_figure, forecast_figure, top_states_figure, age_figure, choropleth_figure, ratio_bar_figure,
+                    ratio_trend_figure, cached_figure)
+from geo import load_simplified_geojson, map_state_names, get_geojson_names, STATE_NAME_MAP, DistrictGeometryStore
+from resolver import NameResolver, name_key
+from store import ResultsStore
+from joined import load_joined, rollup_joined, RATIO_METRICS
+from pincodes import pincode_daily, PincodeIndex
+from tasks import BackgroundTasks
+from perf import timed, tracked_cache, start_run, memory_from_env, log_run, MEMORY_ENV
 
 
 st.set_page_config(
@@ -16,6 +25,10 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+start_run()
+# The loaded dataset is shared by every session; copy-on-write keeps derived
+# frames (filters, slices, assigned columns) from copying or mutating it
+pd.set_option("mode.copy_on_write", True)
 
 # UIDAI Official Color Scheme CSS 
 st.markdown("""
@@ -215,60 +228,165 @@ dataset_type = st.sidebar.selectbox(
     ["enrolment", "biometric", "demographic"],
     help="Select the type of dataset to analyze"
 )
-default_path = {
-    "enrolment": "data/processed/enrollment_clean.csv",
-    "biometric": "data/processed/biometric_clean.csv",
-    "demographic": "data/processed/demographic_clean.csv"
-}[dataset_type]
+default_path = DEFAULT_PATHS[dataset_type]
 
-file_path = st.sidebar.text_input("📂 CSV Path", default_path)
+file_path = st.sidebar.text_input("📂 CSV Path", default_path, help="A CSV file, a folder of CSVs or a glob such as data/2025-*.csv")
 st.sidebar.markdown("### 🎯 Analysis Parameters")
 anomaly_threshold = st.sidebar.slider("🚨 Anomaly Sensitivity", 1.5, 4.0, 2.5, 0.1)
 ma_window = st.sidebar.slider("📉 Smoothing Window", 3, 30, 7, 1)
 forecast_steps = st.sidebar.slider("🔮 Forecast Horizon", 3, 30, 7, 1)
+map_tolerance = st.sidebar.select_slider("🗺️ Map Simplification", [0.0, 0.005, 0.01, 0.02, 0.05], 0.01,
+                                         help="Polygon simplification tolerance in degrees (0 keeps full detail)")
+# tracemalloc is process-wide, so memory tracing is a server setting, not a session toggle
+memory_from_env()
+debug_perf = st.sidebar.checkbox("🧪 Performance Debug", False,
+                                 help=f"Show stage timings and cache hits; memory peaks need {MEMORY_ENV}=1 "
+                                      "on the server and include concurrent sessions")
+
+metric_col = METRIC_COLS[dataset_type]
+
+@tracked_cache("dataset", st.cache_resource(show_spinner="Loading dataset...", max_entries=4))
+def get_dataset(path, dataset_type, version):
+    # Keyed on the file version, never on the frame's contents. The one
+    # frame is shared read-only by every rerun and session.
+    return load_dataset(path, dataset_type)
+
+@st.cache_resource(show_spinner=False)
+def get_results_store():
+    return ResultsStore()
+
+@st.cache_resource(show_spinner=False)
+def get_tasks():
+    # One pool for every session, so identical fits are shared, not repeated
+    return BackgroundTasks()
+
+@tracked_cache("cube", st.cache_resource(show_spinner=False, max_entries=8))
+def get_cube(path, dataset_type, version):
+    # Aggregates precomputed by report.py or another worker are reused
+    # without loading the rows at all. Large sources are streamed in chunks;
+    # row-level views (filters, pincodes, export) still load rows on demand.
+    results = get_results_store()
+    tables = results.get_tables(version, 'aggregates')
+    if tables is None:
+        if source_bytes(path) >= CHUNKED_MIN_BYTES:
+            tables = load_aggregates(path, dataset_type)
+        else:
+            tables = aggregate_frame(get_dataset(path, dataset_type, version))
+        tables = results.put_tables(version, 'aggregates', tables)
+    return AggregateCube(tables)
+
+def load_filtered(path, dataset_type, version, filters):
+    # Slices of the shared frame for sources held in memory. Sources too
+    # large to hold push dates and states down to the snapshots instead.
+    if source_bytes(path) < CHUNKED_MIN_BYTES:
+        return filter_frame(get_dataset(path, dataset_type, version), *filters)
+    date_range, states, districts = filters
+    return filter_frame(load_dataset(path, dataset_type, date_range=date_range, states=states), districts=districts)
+
+@tracked_cache("filtered_cube", st.cache_resource(show_spinner=False, max_entries=32))
+def get_filtered_cube(path, dataset_type, version, filters):
+    return AggregateCube.from_frame(load_filtered(path, dataset_type, version, filters))
 
 # Load data
 try:
-    df = load_dataset(file_path, dataset_type)
+    version = dataset_version(file_path, dataset_type)
 except FileNotFoundError:
     st.error(f"❌ File not found: {file_path}")
     st.stop()
+results = get_results_store()
+cube = get_cube(file_path, dataset_type, version)
+
+# Filters are applied to the date-sorted frame by binary search and
+# categorical codes; each combination's cube is built once
+st.sidebar.markdown("### 🔍 Filters")
+date_range = None
+if cube.has('date'):
+    all_dates = cube.by_date(metric_col)['date']
+    min_date, max_date = all_dates.min().date(), all_dates.max().date()
+    picked_dates = st.sidebar.date_input("📅 Date Range", (min_date, max_date), min_value=min_date, max_value=max_date)
+    if isinstance(picked_dates, (tuple, list)) and len(picked_dates) == 2 and tuple(picked_dates) != (min_date, max_date):
+        date_range = (pd.Timestamp(picked_dates[0]), pd.Timestamp(picked_dates[1]))
+selected_states = st.sidebar.multiselect("🗺️ States", sorted(cube.by_state(metric_col)['state'])) if cube.has('state') else []
+selected_districts = []
+if cube.has('district'):
+    district_options = cube.by_district(metric_col)
+    if selected_states:
+        district_options = district_options[district_options['state'].isin(selected_states)]
+    selected_districts = st.sidebar.multiselect("📍 Districts", sorted(district_options['district'].unique()))
+
+filters = (date_range, tuple(selected_states) or None, tuple(selected_districts) or None)
+# Stored results cover the unfiltered dataset; filtered views are computed live
+result_version = version
+if any(f is not None for f in filters):
+    cube = get_filtered_cube(file_path, dataset_type, version, filters)
+    result_version = None
+# Identifies the rows behind a background task, filtered or not
+view_key = (file_path, dataset_type, version, filters)
+tasks = get_tasks()
+
+@tracked_cache("map_geometry", st.cache_resource(show_spinner=False))
+def get_map_geometry(path, tolerance):
+    return load_simplified_geojson(path, tolerance=tolerance)
 
-df = cache_df(df)
-metric_col = {'enrolment': 'total_enrolment', 'biometric': 'total_biometric', 'demographic': 'total_demographic'}[dataset_type]
+@tracked_cache("state_resolver", st.cache_resource(show_spinner=False))
+def get_state_resolver(feature_names):
+    return NameResolver(feature_names, aliases=STATE_NAME_MAP, label="states")
+
+@tracked_cache("district_store", st.cache_resource(show_spinner=False))
+def get_district_store(path, tolerance):
+    store = DistrictGeometryStore(path, tolerance=tolerance)
+    return store if store.index else None
+
+@tracked_cache("joined", st.cache_resource(show_spinner="Joining datasets...", max_entries=4))
+def get_joined(paths, versions):
+    # paths: ((dataset_type, path), ...); versions only key the cache
+    return load_joined(dict(paths))
+
+@tracked_cache("pincode_index", st.cache_resource(show_spinner="Indexing pincodes...", max_entries=4))
+def get_pincode_index(path, dataset_type, version, metric_col):
+    daily = get_results_store().get_or_compute(
+        version, 'pincode_daily', {'metric': metric_col},
+        lambda: pincode_daily(get_dataset(path, dataset_type, version), metric_col))
+    return PincodeIndex.from_daily(daily, metric_col)
+
+@tracked_cache("district_resolver", st.cache_resource(show_spinner=False, max_entries=64))
+def get_district_resolver(state, district_names):
+    return NameResolver(district_names, label=f"districts_{name_key(state).replace(' ', '_')}")
 
 # KPIs
 st.markdown("## 📊 Key Performance Indicators")
 col1, col2, col3, col4 = st.columns(4)
 with col1:
-    st.metric("📝 Total Records", f"{len(df):,}", "Active")
+    st.metric("📝 Total Records", f"{cube.records:,}", "Active")
 with col2:
-    st.metric(f"🎯 {metric_col.replace('_', ' ').title()}", f"{int(df[metric_col].sum()):,}", f"{int(df[metric_col].mean()):,} avg")
+    metric_total = cube.total(metric_col)
+    st.metric(f"🎯 {metric_col.replace('_', ' ').title()}", f"{int(metric_total):,}", f"{int(metric_total / max(cube.records, 1)):,} avg")
 with col3:
-    st.metric("🗺️ States", f"{df['state'].nunique() if 'state' in df.columns else 0}", "Coverage")
+    st.metric("🗺️ States", f"{cube.n_states}", "Coverage")
 with col4:
-    st.metric("📍 Districts", f"{df['district'].nunique() if 'district' in df.columns else 0}", "Zones")
+    st.metric("📍 Districts", f"{cube.n_districts}", "Zones")
 
 st.markdown("---")
 
 # Tabs
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["📈 Trends", "📊 Geography", "🗺️ Map", "💡 Insights", "📥 Export"])
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📈 Trends", "📊 Geography", "🗺️ Map", "💡 Insights", "📥 Export",
+                                              "🔗 Cross-Dataset"])
 
 # Tab 1: Trends
-with tab1:
+with tab1, timed("tab.trends"):
     st.markdown("### 📈 Trends & Anomaly Detection")
     st.info("🎯 **Objective**: Detect unusual patterns for operational insights")
     
-    if 'date' in df.columns and df['date'].notna().any():
-        ts = df.groupby('date')[metric_col].sum().reset_index().sort_values('date')
-        ts['ma'] = moving_average(ts[metric_col], window=ma_window)
-        anomalies_idx, z = zscore_anomalies(ts[metric_col], threshold=anomaly_threshold)
-        ts['is_anomaly'] = False
-        ts.loc[ts.index[anomalies_idx], 'is_anomaly'] = True
+    if cube.has('date'):
+        ts = results.get_or_compute(result_version, 'timeseries',
+                                    {'metric': metric_col, 'window': ma_window, 'threshold': anomaly_threshold},
+                                    lambda: daily_trend(cube.by_date(metric_col), metric_col, window=ma_window,
+                                                        threshold=anomaly_threshold))
+        anomalies = ts[ts['is_anomaly']]
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.markdown(f'<div class="metric-highlight">🚨 {len(anomalies_idx)} Anomalies</div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="metric-highlight">🚨 {len(anomalies)} Anomalies</div>', unsafe_allow_html=True)
         with col2:
             peak = ts.loc[ts[metric_col].idxmax(), 'date'].strftime("%d %b %Y")
             st.markdown(f'<div class="metric-highlight">📈 Peak: {peak}</div>', unsafe_allow_html=True)
@@ -276,30 +394,8 @@ with tab1:
             avg = int(ts[metric_col].mean())
             st.markdown(f'<div class="metric-highlight">📊 Avg: {avg:,}/day</div>', unsafe_allow_html=True)
         
-        fig_ts = go.Figure()
-        fig_ts.add_trace(go.Scatter(x=ts['date'], y=ts[metric_col], mode='lines+markers', name='Daily', line=dict(color='#2563eb', width=2)))
-        fig_ts.add_trace(go.Scatter(x=ts['date'], y=ts['ma'], mode='lines', name=f'{ma_window}-Day MA', line=dict(dash='dash', color='#1e40af')))
-        anomalies = ts[ts['is_anomaly']]
-        fig_ts.add_trace(go.Scatter(x=anomalies['date'], y=anomalies[metric_col], mode='markers', name='Anomalies', 
-                                    marker=dict(color='#f97316', size=12, symbol='diamond', line=dict(color='white', width=2))))
-        fig_ts.update_layout(
-            title=dict(text="Daily Activity with Anomalies", font=dict(color='#1e293b', size=18)),
-            template="plotly_white", 
-            height=500, 
-            hovermode='x unified',
-            paper_bgcolor='white',
-            plot_bgcolor='white',
-            font=dict(color='#1e293b', size=12),
-            xaxis=dict(
-                title=dict(text='Date', font=dict(color='#1e293b', size=14)),
-                tickfont=dict(color='#1e293b', size=12)
-            ),
-            yaxis=dict(
-                title=dict(text='Activity Count', font=dict(color='#1e293b', size=14)),
-                tickfont=dict(color='#1e293b', size=12)
-            )
-        )
-        st.plotly_chart(fig_ts, use_container_width=True)
+        fig_ts = cached_figure(trend_figure, ts, metric_col, ma_window)
+        show_chart(fig_ts)
         
         if len(anomalies) > 0:
             with st.expander(f"🔍 View {len(anomalies)} Anomalies"):
@@ -308,104 +404,125 @@ with tab1:
                 st.dataframe(anom, hide_index=True)
         
         st.markdown("### 🔮 Forecast")
-        fc = arima_forecast(ts[['date', metric_col]].rename(columns={metric_col: 'value'}), 'value', steps=forecast_steps)
-        fig_fc = go.Figure()
-        fig_fc.add_trace(go.Scatter(x=ts['date'], y=ts[metric_col], mode='lines', name='History', line=dict(color='#2563eb')))
-        fig_fc.add_trace(go.Scatter(x=fc['date'], y=fc['forecast'], mode='lines+markers', name='Forecast', 
-                                    line=dict(color='#f97316', width=3, dash='dot')))
-        fig_fc.update_layout(
-            title=dict(text=f"{forecast_steps}-Day Forecast", font=dict(color='#1e293b', size=18)),
-            template="plotly_white", 
-            height=400,
-            paper_bgcolor='white',
-            plot_bgcolor='white',
-            font=dict(color='#1e293b', size=12),
-            xaxis=dict(
-                title=dict(text='Date', font=dict(color='#1e293b', size=14)),
-                tickfont=dict(color='#1e293b', size=12)
-            ),
-            yaxis=dict(
-                title=dict(text='Forecasted Value', font=dict(color='#1e293b', size=14)),
-                tickfont=dict(color='#1e293b', size=12)
-            )
-        )
-        st.plotly_chart(fig_fc, use_container_width=True)
+        history = ts[['date', metric_col]]
+        # Only the history columns, so the smoothing window does not invalidate it
+        background_panel(tasks, ('forecast', view_key, metric_col, forecast_steps),
+                         lambda: results.get_or_compute(result_version, 'forecast',
+                                                        {'metric': metric_col, 'steps': forecast_steps},
+                                                        lambda: arima_forecast(history.rename(columns={metric_col: 'value'}),
+                                                                               'value', steps=forecast_steps)),
+                         lambda fc: show_chart(cached_figure(forecast_figure, history, fc, metric_col, forecast_steps)),
+                         message="⏳ Fitting the forecast model...")
 
 # Tab 2: Geography
-with tab2:
+with tab2, timed("tab.geography"):
     st.markdown("### 📊 Geographic Distribution")
     st.info("🎯 **Objective**: Identify coverage gaps and resource allocation needs")
     
-    if 'state' in df.columns:
-        state_data = df.groupby('state')[metric_col].sum().reset_index().sort_values(metric_col, ascending=False)
+    if cube.has('state'):
+        state_data = cube.by_state(metric_col).sort_values(metric_col, ascending=False)
         
-        fig_geo = go.Figure(go.Bar(x=state_data['state'].head(15), y=state_data['total'].head(15) if 'total' in state_data else state_data[metric_col].head(15),
-                                   marker=dict(color=state_data[metric_col].head(15), colorscale=[[0, '#2563eb'], [1, '#f97316']]),
-                                   text=state_data[metric_col].head(15), texttemplate='%{text:,.0f}'))
-        fig_geo.update_layout(
-            title=dict(text="Top 15 States", font=dict(color='#1e293b', size=18)),
-            template="plotly_white", 
-            height=500,
-            paper_bgcolor='white',
-            plot_bgcolor='white',
-            font=dict(color='#1e293b', size=12),
-            xaxis=dict(
-                title=dict(text='State', font=dict(color='#1e293b', size=14)),
-                tickfont=dict(color='#1e293b', size=12)
-            ),
-            yaxis=dict(
-                title=dict(text='Total Count', font=dict(color='#1e293b', size=14)),
-                tickfont=dict(color='#1e293b', size=12)
-            )
-        )
-        st.plotly_chart(fig_geo, use_container_width=True)
-    
-    if dataset_type == 'enrolment' and 'age_0_5' in df.columns:
+        fig_geo = cached_figure(top_states_figure, state_data, metric_col)
+        show_chart(fig_geo)
+    
+    if dataset_type == 'enrolment' and 'age_0_5' in cube.columns():
         age_df = pd.DataFrame({'age_group': ['0-5 Years', '5-17 Years', '18+ Years'],
-                              'count': [df['age_0_5'].sum(), df['age_5_17'].sum(), df['age_18_greater'].sum()]})
-        fig_age = px.pie(age_df, names='age_group', values='count', title="Age Distribution", hole=0.4,
-                        color_discrete_sequence=['#2563eb', '#f97316', '#1e40af'])
-        fig_age.update_layout(
-            paper_bgcolor='white',
-            plot_bgcolor='white',
-            font=dict(color='#1e293b', size=12),
-            title=dict(font=dict(color='#1e293b', size=18))
-        )
-        st.plotly_chart(fig_age, use_container_width=True)
+                              'count': [cube.total('age_0_5'), cube.total('age_5_17'), cube.total('age_18_greater')]})
+        fig_age = cached_figure(age_figure, age_df)
+        show_chart(fig_age)
+
+    if cube.has('district'):
+        st.markdown("### 📮 Pincode Hotspots")
+        # Builds from every row on a results-store miss, so it is opt-in like the Cross-Dataset tab
+        if st.toggle("Index pincodes", key="load_pincodes", help="Loads the dataset's rows the first time"):
+            pin_index = get_pincode_index(file_path, dataset_type, version, metric_col)
+            if len(pin_index) == 0:
+                st.info("No pincode data in this dataset")
+            else:
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    pin_state = st.selectbox("🗺️ State", ["All"] + sorted(pin_index.keys['state'].unique()), key="pin_state")
+                with col2:
+                    pin_districts = [] if pin_state == "All" else \
+                        sorted(pin_index.keys.loc[pin_index.keys['state'] == pin_state, 'district'].unique())
+                    pin_district = st.selectbox("📍 District", ["All"] + pin_districts, key="pin_district")
+                with col3:
+                    pin_days = st.slider("📅 Last N Days", 7, 365, 30, key="pin_days")
+                with col4:
+                    pin_top = st.number_input("🔝 Top K", 5, 500, 50, step=5, key="pin_top")
+
+                location = dict(state=None if pin_state == "All" else pin_state,
+                                district=None if pin_district == "All" else pin_district)
+                with timed("pincode.top_k") as query:
+                    hotspots = pin_index.top_k(int(pin_top), last_days=pin_days, **location)
+                st.caption(f"Top {len(hotspots)} of {len(pin_index):,} pincodes up to {pin_index.end:%d %b %Y} "
+                           f"({query.seconds * 1000:.1f} ms)")
+                st.dataframe(hotspots.rename(columns={'total': f'last_{pin_days}_days'}), hide_index=True)
+
+                pin_prefix = st.text_input("🔎 Pincode Prefix", "", key="pin_prefix", help="First digits of a 6-digit pincode")
+                if pin_prefix:
+                    matches = pin_index.prefix(pin_prefix)
+                    totals = pin_index.range_totals(start=pin_index.end - pd.Timedelta(days=pin_days - 1))
+                    st.dataframe(matches.merge(totals, on=['state', 'district', 'pincode'], how='left')
+                                 .rename(columns={'total': f'last_{pin_days}_days'}), hide_index=True)
+
+                drops = pin_index.drops(window=pin_days, threshold=anomaly_threshold, **location)
+                with st.expander(f"📉 {len(drops)} pincodes with anomalous drops"):
+                    st.dataframe(drops, hide_index=True)
 
 # Tab 3: Map
-with tab3:
+with tab3, timed("tab.map"):
     st.markdown("### 🗺️ Interactive Heatmap")
     st.info("🎯 **Objective**: Visualize regional activity hotspots")
+    map_level = st.radio("🔎 Map Level", ["State", "District"], horizontal=True)
     
-    if 'state' in df.columns:
-        geojson = load_geojson("assets/india_states.geojson")
+    if map_level == "State" and cube.has('state'):
+        geojson, property_key = get_map_geometry("assets/india_states.geojson", map_tolerance)
         if geojson:
-            property_key = get_geojson_property_key(geojson)
             if property_key:
-                df_map = map_state_names(df.copy())
-                state_totals = df_map.groupby('state')[metric_col].sum().reset_index()
+                resolver = get_state_resolver(tuple(get_geojson_names(geojson, property_key)))
+                state_map = map_state_names(cube.by_state(metric_col), resolver=resolver)
+                state_totals = state_map.groupby('state', observed=True)[metric_col].sum().reset_index()
+                unmatched = state_totals[~state_totals['state'].isin(resolver.canonical)]
+                if len(unmatched) > 0:
+                    with st.expander(f"⚠️ {len(unmatched)} state names not matched to the map"):
+                        st.dataframe(unmatched.sort_values(metric_col, ascending=False), hide_index=True)
                 
                 try:
-                    fig_map = px.choropleth(state_totals, geojson=geojson, locations='state',
-                                           featureidkey=property_key, color=metric_col,
-                                           color_continuous_scale=[[0, '#eff6ff'], [0.5, '#2563eb'], [1, '#f97316']], 
-                                           hover_name='state')
-                    fig_map.update_geos(fitbounds="locations", visible=False, bgcolor='white')
-                    fig_map.update_layout(
-                        height=700, 
-                        paper_bgcolor='white', 
-                        plot_bgcolor='white', 
-                        geo=dict(bgcolor='white'),
-                        font=dict(color='#1e293b', size=12),
-                        title=dict(font=dict(color='#1e293b', size=18))
-                    )
-                    st.plotly_chart(fig_map, use_container_width=True)
+                    fig_map = cached_figure(choropleth_figure, state_totals, geojson, 'state', property_key, metric_col)
+                    show_chart(fig_map)
+                except Exception as e:
+                    st.error(f"Map error: {e}")
+
+    elif map_level == "District" and cube.has('district'):
+        store = get_district_store("assets/india_districts.geojson", map_tolerance)
+        if store is None:
+            st.warning("District boundaries are not available")
+        else:
+            selected_state = st.selectbox("🗺️ State", store.states())
+            district_map = map_state_names(cube.by_district(metric_col), resolver=get_state_resolver(tuple(store.states())))
+            district_map = district_map[district_map['state'] == selected_state]
+            district_resolver = get_district_resolver(selected_state, tuple(store.districts(selected_state)))
+            district_map = district_map.assign(district=district_resolver.resolve_series(district_map['district'].astype(object)))
+            district_totals = district_map.groupby('district')[metric_col].sum().reset_index()
+            unmatched = district_totals[~district_totals['district'].isin(district_resolver.canonical)]
+            if len(unmatched) > 0:
+                with st.expander(f"⚠️ {len(unmatched)} district names not matched to the map"):
+                    st.dataframe(unmatched.sort_values(metric_col, ascending=False), hide_index=True)
+
+            if len(district_totals) == 0:
+                st.info(f"No district data for {selected_state}")
+            else:
+                try:
+                    fig_district = cached_figure(choropleth_figure, district_totals, store.load_state(selected_state),
+                                                 'district', store.property_key, metric_col,
+                                                 bbox=store.bbox(selected_state), title=f"{selected_state} Districts")
+                    show_chart(fig_district)
                 except Exception as e:
                     st.error(f"Map error: {e}")
 
 # Tab 4: Insights
-with tab4:
+with tab4, timed("tab.insights"):
     st.markdown("### 💡 Actionable Insights")
     st.markdown("""
     <div style='background: linear-gradient(135deg, #dbeafe, #bfdbfe); padding: 25px; border-radius: 15px; border: 2px solid #2563eb;'>
@@ -422,34 +539,128 @@ with tab4:
     """, unsafe_allow_html=True)
     
     st.markdown("### 🔍 Key Findings")
-    if 'date' in df.columns:
-        ts_summary = df.groupby('date')[metric_col].sum()
+    if cube.has('date'):
+        ts_summary = cube.by_date(metric_col).set_index('date')[metric_col]
         peak_val = ts_summary.max()
         peak_date = ts_summary.idxmax().strftime('%d %b %Y')
         st.success(f"**Peak Activity**: {int(peak_val):,} on {peak_date}")
     
-    if 'state' in df.columns:
-        top_state = df.groupby('state')[metric_col].sum().idxmax()
+    if cube.has('state'):
+        top_state = cube.by_state(metric_col).set_index('state')[metric_col].idxmax()
         st.success(f"**Top State**: {top_state}")
 
+    if cube.has('district_date'):
+        st.markdown("### 🚨 State & District Anomalies")
+        anomaly_level = st.radio("Level", ["State", "District"], horizontal=True, key="anomaly_level")
+        anomaly_method = st.radio("Method", ["zscore", "robust", "rolling"], horizontal=True, key="anomaly_method",
+                                  help="Global z-score, median/MAD, or z-score against the previous 28 days")
+        if anomaly_level == "State":
+            compute_anomalies = lambda: panel_anomalies(cube.by_state_date(metric_col), 'state', metric_col,
+                                                        threshold=anomaly_threshold, method=anomaly_method)
+        else:
+            compute_anomalies = lambda: panel_anomalies(cube.by_district_date(metric_col), ['state', 'district'],
+                                                        metric_col, threshold=anomaly_threshold, method=anomaly_method)
+        anomaly_params = {'metric': metric_col, 'method': anomaly_method, 'threshold': anomaly_threshold}
+
+        def show_anomalies(local_anomalies):
+            st.caption(f"{len(local_anomalies):,} flagged points")
+            if len(local_anomalies) > 0:
+                top_anomalies = local_anomalies.reindex(local_anomalies['score'].abs().sort_values(ascending=False).index).head(20)
+                top_anomalies['date'] = top_anomalies['date'].dt.strftime('%d %b %Y')
+                st.dataframe(top_anomalies, hide_index=True)
+
+        anomaly_name = f"{anomaly_level.lower()}_anomalies"
+        background_panel(tasks, (anomaly_name, view_key, *anomaly_params.values()),
+                         lambda: results.get_or_compute(result_version, anomaly_name, anomaly_params, compute_anomalies),
+                         show_anomalies, message="⏳ Scanning for anomalies...")
+
+    if cube.has('state_date'):
+        st.markdown("### 🔮 State Forecasts")
+        state_fc_key = ('state_forecasts', view_key, metric_col, forecast_steps)
+
+        def show_state_outlook(state_fc):
+            state_outlook = state_fc.groupby('state', observed=True)['forecast'].sum().reset_index()
+            state_outlook.columns = ['state', f'next_{forecast_steps}_days']
+            st.dataframe(state_outlook.sort_values(state_outlook.columns[1], ascending=False), hide_index=True)
+
+        # Stays shown once requested, by this or any other session
+        if st.button("Forecast all states") or tasks.get(state_fc_key) is not None:
+            background_panel(tasks, state_fc_key,
+                             lambda: results.get_or_compute(result_version, 'state_forecasts',
+                                                            {'metric': metric_col, 'steps': forecast_steps},
+                                                            lambda: batch_forecast(cube.by_state_date(metric_col),
+                                                                                   'state', metric_col,
+                                                                                   steps=forecast_steps)),
+                             show_state_outlook, message="⏳ Fitting one model per state...")
+
 # Tab 5: Export
-with tab5:
+with tab5, timed("tab.export"):
     st.markdown("### 📥 Data Export")
     st.info("Download processed data and insights for further analysis")
     
-    @st.cache_data
-    def convert_df(dataframe):
-        return dataframe.to_csv(index=False).encode('utf-8')
-    
-    if st.button("📊 Export Current Dataset"):
-        csv = convert_df(df)
-        st.download_button("⬇️ Download CSV", csv, f"uidai_{dataset_type}_export.csv", "text/csv")
-    
-    if 'date' in df.columns:
-        ts_export = df.groupby('date')[metric_col].sum().reset_index()
-        if st.button("📈 Export Time Series"):
-            ts_csv = convert_df(ts_export)
-            st.download_button("⬇️ Download Time Series", ts_csv, "uidai_timeseries.csv", "text/csv")
+    # Views are built lazily so only the selected one is materialised
+    export_views = {"Filtered Records": lambda: load_filtered(file_path, dataset_type, version, filters)}
+    if cube.has('date'):
+        export_views["Daily Time Series"] = lambda: cube.by_date(metric_col)
+    if cube.has('state'):
+        export_views["State Totals"] = lambda: cube.by_state(metric_col)
+    if cube.has('district'):
+        export_views["District Totals"] = lambda: cube.by_district(metric_col)
+    if cube.has('state_date'):
+        export_views["State x Date"] = lambda: cube.by_state_date(metric_col)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        export_view = st.selectbox("📄 View", list(export_views))
+    with col2:
+        export_format = st.selectbox("🗜️ Format", list(EXPORT_FORMATS))
+    
+    extension, mime = EXPORT_FORMATS[export_format]
+    file_name = f"uidai_{dataset_type}_{export_view.lower().replace(' ', '_')}.{extension}"
+    # Deferred: the file is only written when the button is clicked
+    st.download_button("⬇️ Download",
+                       lambda view=export_views[export_view], ext=extension: FileReader(export_frame(view(), ext)),
+                       file_name, mime)
+
+# Tab 6: Cross-dataset ratios
+with tab6, timed("tab.cross_dataset"):
+    st.markdown("### 🔗 Cross-Dataset View")
+    st.info("🎯 **Objective**: Compare biometric and demographic updates against enrolment")
+
+    joined_paths = {t: (file_path if t == dataset_type else p) for t, p in DEFAULT_PATHS.items()}
+    with st.expander("📂 Dataset Paths"):
+        joined_paths = {t: st.text_input(f"{t.title()} CSV", p, key=f"joined_{t}") for t, p in joined_paths.items()}
+
+    # All three datasets are loaded only on request
+    if st.toggle("Load all three datasets", key="load_joined"):
+        try:
+            versions = tuple(dataset_version(p, t) for t, p in joined_paths.items())
+        except FileNotFoundError as e:
+            st.error(f"❌ File not found: {e}")
+        else:
+            # Joined totals are date-sorted, so the sidebar filters apply directly
+            joined = filter_frame(get_joined(tuple(joined_paths.items()), versions), *filters)
+            overall = rollup_joined(joined, [])
+            ratio_cols = st.columns(len(RATIO_METRICS))
+            for col, name in zip(ratio_cols, RATIO_METRICS):
+                value = overall[name].iloc[0] if name in overall.columns else float('nan')
+                col.metric(f"⚖️ {name.replace('_', ' ').title()}", "—" if pd.isna(value) else f"{value:.2f}")
+
+            col1, col2 = st.columns(2)
+            with col1:
+                joined_level = st.radio("Level", ["State", "District"], horizontal=True, key="joined_level")
+            with col2:
+                ratio_col = st.selectbox("Ratio", list(RATIO_METRICS), key="joined_ratio")
+            level_keys = ['state'] if joined_level == "State" else ['state', 'district']
+            ratios = rollup_joined(joined, level_keys)
+            if ratio_col in ratios.columns:
+                show_chart(cached_figure(ratio_bar_figure, ratios, level_keys[-1], ratio_col))
+                show_chart(cached_figure(ratio_trend_figure, rollup_joined(joined, ['date']), ratio_col))
+                st.dataframe(ratios.sort_values(ratio_col, ascending=False), hide_index=True)
 
 st.markdown("---")
 st.markdown("<p style='text-align: center; color: #666;'> UIDAI Data Hackathon 2026 </p>", unsafe_allow_html=True)
+
+log_run()
+if debug_perf:
+    perf_panel(tasks=tasks)
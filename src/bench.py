@@ -0,0 +1,155 @@
+"""
+Benchmark the pipeline stages on synthetic data and append the timings to
+a JSON lines file so runs can be compared over time.
+
+    python src/bench.py --sizes 10000 1000000 --types enrolment
+    python src/bench.py --compare
+"""
+import os
+import json
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from synth import write_csv, DATASET_COLUMNS
+from preprocess import load_dataset, aggregate_frame, METRIC_COLS
+from geo import map_state_names
+from analytics import zscore_anomalies, moving_average, arima_forecast
+from perf import timed
+
+BENCH_RESULTS = "benchmarks/results.jsonl"
+
+
+def measure(fn, *args, **kwargs):
+    """Run fn once; returns (result, seconds, peak traced MB)"""
+    tracemalloc.start()
+    try:
+        # Instrumented stages inside fn reset the tracemalloc peak, timed() accounts for them
+        with timed("bench") as stage:
+            result = fn(*args, **kwargs)
+    finally:
+        tracemalloc.stop()
+    return result, stage.seconds, stage.peak_mb
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def bench_dataset(path: str, dataset_type: str, cache_dir: str):
+    """Time each stage on one file; returns {stage: (seconds, peak_mb)}"""
+    metric_col = METRIC_COLS[dataset_type]
+    stages = {}
+
+    def stage(name, fn, *args, **kwargs):
+        result, seconds, peak_mb = measure(fn, *args, **kwargs)
+        stages[name] = (seconds, peak_mb)
+        return result
+
+    df = stage('load_dataset (parse)', load_dataset, path, dataset_type, cache_dir=cache_dir)
+    stage('load_dataset (snapshot)', load_dataset, path, dataset_type, cache_dir=cache_dir)
+    stage('aggregate_frame', aggregate_frame, df)
+    stage('map_state_names', map_state_names, df)
+    # Row-level series, so these scale with the input rather than the number of days
+    stage('zscore_anomalies', zscore_anomalies, df[metric_col])
+    stage('moving_average', moving_average, df[metric_col])
+
+    daily = df.groupby('date', observed=True)[metric_col].sum().reset_index()
+    stage('arima_forecast', arima_forecast, daily, metric_col, cache=None)
+    return stages
+
+
+def run_benchmark(sizes, dataset_types, out: str = BENCH_RESULTS, data_dir=None, days: int = 365, label=None):
+    """
+    Generate each size once, benchmark it and append one record per stage
+    to ``out``. Generated files go to ``data_dir`` (kept) or a temporary
+    directory (removed afterwards).
+    """
+    run = {
+        'run_id': datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'),
+        'label': label,
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+    }
+    work_dir = data_dir or tempfile.mkdtemp(prefix="uidai_bench_")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    try:
+        for dataset_type in dataset_types:
+            for rows in sizes:
+                path = os.path.join(work_dir, f"{dataset_type}_{rows}.csv")
+                if not os.path.exists(path):
+                    write_csv(path, rows, dataset_type, days=days)
+                # A fresh snapshot directory so the parse stage is always cold
+                cache_dir = tempfile.mkdtemp(prefix="snapshots_", dir=work_dir)
+                try:
+                    stages = bench_dataset(path, dataset_type, cache_dir)
+                finally:
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                with open(out, "a", encoding="utf-8") as f:
+                    for stage, (seconds, peak_mb) in stages.items():
+                        record = dict(run, dataset_type=dataset_type, rows=rows, stage=stage,
+                                      seconds=round(seconds, 4), peak_mb=round(peak_mb, 2))
+                        f.write(json.dumps(record) + "\n")
+                        print(f"{dataset_type:12} {rows:>12,} {stage:26} {seconds:9.3f}s {peak_mb:10.1f} MB")
+    finally:
+        if data_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return run['run_id']
+
+
+def compare_runs(path: str = BENCH_RESULTS, baseline=None, current=None):
+    """
+    Stage timings of two runs side by side (default: the last two), with
+    the current/baseline ratio so regressions stand out.
+    """
+    results = pd.read_json(path, lines=True)
+    run_ids = list(dict.fromkeys(results['run_id']))
+    if len(run_ids) < 2 and (baseline is None or current is None):
+        raise ValueError("Need at least two benchmark runs to compare")
+    baseline = baseline or run_ids[-2]
+    current = current or run_ids[-1]
+    keys = ['dataset_type', 'rows', 'stage']
+    table = (results[results['run_id'] == baseline].set_index(keys)[['seconds', 'peak_mb']]
+             .join(results[results['run_id'] == current].set_index(keys)[['seconds', 'peak_mb']],
+                   lsuffix='_baseline', rsuffix='_current', how='inner'))
+    table['time_ratio'] = (table['seconds_current'] / table['seconds_baseline']).round(2)
+    table['memory_ratio'] = (table['peak_mb_current'] / table['peak_mb_baseline']).round(2)
+    return table.reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the UIDAI pipeline on synthetic data")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--types", nargs="+", default=['enrolment'], choices=list(DATASET_COLUMNS))
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--out", default=BENCH_RESULTS, help="JSON lines file results are appended to")
+    parser.add_argument("--data-dir", default=None, help="Keep generated CSVs here and reuse them")
+    parser.add_argument("--label", default=None, help="Free-text tag stored with the run")
+    parser.add_argument("--compare", action="store_true", help="Compare the last two runs instead of benchmarking")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        try:
+            print(compare_runs(args.out).to_string(index=False))
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            return 1
+        return 0
+    run_benchmark(args.sizes, args.types, args.out, args.data_dir, args.days, args.label)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,269 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from perf import cache_event
+
+# Line charts are downsampled to at most this many points before plotting
+MAX_POINTS = 2000
+# Above this many points traces are drawn with WebGL
+WEBGL_THRESHOLD = 1000
+
+
+def _axis(title: str):
+    return dict(
+        title=dict(text=title, font=dict(color='#1e293b', size=14)),
+        tickfont=dict(color='#1e293b', size=12)
+    )
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int):
+    """
+    Largest-Triangle-Three-Buckets: positions of ``n_out`` points that keep
+    the visual shape of the series, always including the first and last.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    edges[-1] = n - 1
+
+    picked = np.empty(n_out, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # The third vertex is the average of the next bucket (or the last point)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def downsample(df: pd.DataFrame, x_col: str, y_col: str, max_points: int = MAX_POINTS, keep=None):
+    """
+    At most ``max_points`` rows of a sorted series chosen by LTTB, plus every
+    row where the boolean column ``keep`` (e.g. anomaly flags) is set
+    """
+    if len(df) <= max_points:
+        return df
+    x = df[x_col]
+    x = x.to_numpy(dtype='datetime64[ns]').astype('int64') if pd.api.types.is_datetime64_any_dtype(x) else x.to_numpy()
+    rows = lttb_indices(x, df[y_col].to_numpy(), max_points)
+    if keep is not None:
+        rows = np.union1d(rows, np.flatnonzero(df[keep].to_numpy()))
+    return df.iloc[rows]
+
+
+def _scatter(n_points: int):
+    return go.Scattergl if n_points > WEBGL_THRESHOLD else go.Scatter
+
+
+def trend_figure(ts: pd.DataFrame, metric_col: str, ma_window: int, max_points: int = MAX_POINTS):
+    """Daily series with its moving average and flagged anomalies"""
+    anomalies = ts[ts['is_anomaly']]
+    ts = downsample(ts, 'date', metric_col, max_points, keep='is_anomaly')
+    scatter = _scatter(len(ts))
+    fig_ts = go.Figure()
+    fig_ts.add_trace(scatter(x=ts['date'], y=ts[metric_col], mode='lines+markers', name='Daily', line=dict(color='#2563eb', width=2)))
+    fig_ts.add_trace(scatter(x=ts['date'], y=ts['ma'], mode='lines', name=f'{ma_window}-Day MA', line=dict(dash='dash', color='#1e40af')))
+    fig_ts.add_trace(_scatter(len(anomalies))(x=anomalies['date'], y=anomalies[metric_col], mode='markers', name='Anomalies',
+                                              marker=dict(color='#f97316', size=12, symbol='diamond', line=dict(color='white', width=2))))
+    fig_ts.update_layout(
+        title=dict(text="Daily Activity with Anomalies", font=dict(color='#1e293b', size=18)),
+        template="plotly_white",
+        height=500,
+        hovermode='x unified',
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font=dict(color='#1e293b', size=12),
+        xaxis=_axis('Date'),
+        yaxis=_axis('Activity Count')
+    )
+    return fig_ts
+
+
+def forecast_figure(ts: pd.DataFrame, fc: pd.DataFrame, metric_col: str, forecast_steps: int,
+                    max_points: int = MAX_POINTS):
+    """History followed by the forecast"""
+    ts = downsample(ts, 'date', metric_col, max_points)
+    fig_fc = go.Figure()
+    fig_fc.add_trace(_scatter(len(ts))(x=ts['date'], y=ts[metric_col], mode='lines', name='History', line=dict(color='#2563eb')))
+    fig_fc.add_trace(go.Scatter(x=fc['date'], y=fc['forecast'], mode='lines+markers', name='Forecast',
+                                line=dict(color='#f97316', width=3, dash='dot')))
+    fig_fc.update_layout(
+        title=dict(text=f"{forecast_steps}-Day Forecast", font=dict(color='#1e293b', size=18)),
+        template="plotly_white",
+        height=400,
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font=dict(color='#1e293b', size=12),
+        xaxis=_axis('Date'),
+        yaxis=_axis('Forecasted Value')
+    )
+    return fig_fc
+
+
+def top_states_figure(state_data: pd.DataFrame, metric_col: str, top_n: int = 15):
+    """Bar chart of the top states; ``state_data`` must be sorted descending"""
+    top = state_data.head(top_n)
+    fig_geo = go.Figure(go.Bar(x=top['state'], y=top[metric_col],
+                               marker=dict(color=top[metric_col], colorscale=[[0, '#2563eb'], [1, '#f97316']]),
+                               text=top[metric_col], texttemplate='%{text:,.0f}'))
+    fig_geo.update_layout(
+        title=dict(text=f"Top {top_n} States", font=dict(color='#1e293b', size=18)),
+        template="plotly_white",
+        height=500,
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font=dict(color='#1e293b', size=12),
+        xaxis=_axis('State'),
+        yaxis=_axis('Total Count')
+    )
+    return fig_geo
+
+
+def age_figure(age_df: pd.DataFrame):
+    fig_age = px.pie(age_df, names='age_group', values='count', title="Age Distribution", hole=0.4,
+                     color_discrete_sequence=['#2563eb', '#f97316', '#1e40af'])
+    fig_age.update_layout(
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font=dict(color='#1e293b', size=12),
+        title=dict(font=dict(color='#1e293b', size=18))
+    )
+    return fig_age
+
+
+def ratio_bar_figure(table: pd.DataFrame, label_col: str, ratio_col: str, top_n: int = 15):
+    """Highest ratios first"""
+    top = table.dropna(subset=[ratio_col]).nlargest(top_n, ratio_col)
+    labels = top[label_col].astype(str)
+    if 'state' in top.columns and label_col != 'state':
+        labels = labels + " (" + top['state'].astype(str) + ")"
+    fig = go.Figure(go.Bar(x=labels, y=top[ratio_col], marker=dict(color='#2563eb'),
+                           text=top[ratio_col], texttemplate='%{text:.2f}'))
+    fig.update_layout(
+        title=dict(text=f"Top {top_n} by {ratio_col.replace('_', ' ')}", font=dict(color='#1e293b', size=18)),
+        template="plotly_white",
+        height=500,
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font=dict(color='#1e293b', size=12),
+        xaxis=_axis(label_col.title()),
+        yaxis=_axis('Ratio')
+    )
+    return fig
+
+
+def ratio_trend_figure(daily: pd.DataFrame, ratio_col: str, max_points: int = MAX_POINTS):
+    """Daily ratio over time"""
+    daily = downsample(daily.dropna(subset=[ratio_col]), 'date', ratio_col, max_points)
+    fig = go.Figure(_scatter(len(daily))(x=daily['date'], y=daily[ratio_col], mode='lines', name=ratio_col,
+                                         line=dict(color='#f97316', width=2)))
+    fig.update_layout(
+        title=dict(text=f"Daily {ratio_col.replace('_', ' ')}", font=dict(color='#1e293b', size=18)),
+        template="plotly_white",
+        height=400,
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font=dict(color='#1e293b', size=12),
+        xaxis=_axis('Date'),
+        yaxis=_axis('Ratio')
+    )
+    return fig
+
+
+def choropleth_figure(totals: pd.DataFrame, geojson: dict, location_col: str, property_key: str, metric_col: str,
+                      bbox=None, title=None):
+    """
+    Choropleth of ``totals`` over ``geojson``. With a precomputed bbox
+    ([min_lon, min_lat, max_lon, max_lat]) the view is set directly
+    instead of fitted to the locations.
+    """
+    fig_map = px.choropleth(totals, geojson=geojson, locations=location_col,
+                            featureidkey=property_key, color=metric_col,
+                            color_continuous_scale=[[0, '#eff6ff'], [0.5, '#2563eb'], [1, '#f97316']],
+                            hover_name=location_col)
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        fig_map.update_geos(lonaxis_range=[min_lon, max_lon], lataxis_range=[min_lat, max_lat],
+                            visible=False, bgcolor='white')
+    else:
+        fig_map.update_geos(fitbounds="locations", visible=False, bgcolor='white')
+    fig_map.update_layout(
+        height=700,
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        geo=dict(bgcolor='white'),
+        font=dict(color='#1e293b', size=12),
+        title=dict(text=title, font=dict(color='#1e293b', size=18))
+    )
+    return fig_map
+
+
+def _fingerprint(value, pinned: list):
+    """Hashable key part for a builder argument"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest = hashlib.sha1(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        digest.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode("utf-8"))
+        return ('frame', digest.hexdigest())
+    if isinstance(value, dict):
+        # GeoJSON and similar objects come from resource caches: keyed on
+        # identity and pinned by the entry so the id cannot be reused
+        pinned.append(value)
+        return ('object', id(value))
+    return ('value', repr(value))
+
+
+class FigureCache:
+    """
+    Built figures keyed on the builder and a fingerprint of its arguments:
+    frame contents plus parameter values. A rerun only rebuilds the figures
+    whose own inputs changed. Cached figures are shared and must not be
+    modified by callers.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, builder, *args, **kwargs):
+        pinned = []
+        key = (builder.__qualname__,
+               tuple(_fingerprint(a, pinned) for a in args),
+               tuple((k, _fingerprint(v, pinned)) for k, v in sorted(kwargs.items())))
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                cache_event('figure', True)
+                return self._figures[key][0]
+
+        fig = builder(*args, **kwargs)
+        with self._lock:
+            self.misses += 1
+            self._figures[key] = (fig, pinned)
+            while len(self._figures) > self.max_entries:
+                self._figures.popitem(last=False)
+        cache_event('figure', False)
+        return fig
+
+
+FIGURE_CACHE = FigureCache()
+
+
+def cached_figure(builder, *args, **kwargs):
+    """``builder(*args, **kwargs)``, reused while its inputs are unchanged"""
+    return FIGURE_CACHE.get(builder, *args, **kwargs)
@@ -0,0 +1,73 @@
+import pandas as pd
+
+from preprocess import aggregate_frame
+
+LOCATION_COLS = ['state', 'district']
+
+
+class AggregateCube:
+    """
+    Date, state, district, state x date and district x date rollups of one
+    dataset version. Built once and shared by every dashboard tab so reruns
+    never rescan rows.
+    Tables are read-only; accessors return fresh frames.
+    """
+
+    def __init__(self, tables: dict):
+        self.tables = {}
+        for name, table in tables.items():
+            table = table.copy()
+            for col in LOCATION_COLS:
+                if col in table.columns:
+                    table[col] = table[col].astype('category')
+            self.tables[name] = table
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, value_cols=None):
+        return cls(aggregate_frame(df, value_cols))
+
+    def has(self, name: str):
+        table = self.tables.get(name)
+        return table is not None and len(table) > 0
+
+    def columns(self):
+        total = self.tables.get('total')
+        return [] if total is None else list(total.columns)
+
+    def total(self, col: str):
+        total = self.tables.get('total')
+        if total is None or col not in total.columns:
+            return 0
+        return total[col].iloc[0]
+
+    @property
+    def records(self):
+        return int(self.total('records'))
+
+    @property
+    def n_states(self):
+        return len(self.tables['state']) if self.has('state') else 0
+
+    @property
+    def n_districts(self):
+        return self.tables['district']['district'].nunique() if self.has('district') else 0
+
+    def by_date(self, metric_col: str):
+        return self._select('date', ['date'], metric_col).sort_values('date').reset_index(drop=True)
+
+    def by_state(self, metric_col: str):
+        return self._select('state', ['state'], metric_col)
+
+    def by_district(self, metric_col: str):
+        return self._select('district', ['state', 'district'], metric_col)
+
+    def by_state_date(self, metric_col: str):
+        return self._select('state_date', ['state', 'date'], metric_col)
+
+    def by_district_date(self, metric_col: str):
+        return self._select('district_date', ['state', 'district', 'date'], metric_col)
+
+    def _select(self, name, keys, metric_col):
+        if not self.has(name):
+            return pd.DataFrame(columns=keys + [metric_col])
+        return self.tables[name][keys + [metric_col]].copy()
@@ -0,0 +1,102 @@
+import io
+import gzip
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'CSV (zstd)': ('csv.zst', 'application/zstd'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Exports up to this size stay in memory, larger ones roll over to disk
+SPOOL_LIMIT = 32 * 1024 * 1024
+
+
+class _KeepOpen(io.RawIOBase):
+    """Forwards writes to a file but ignores close(), so wrapping streams can be finalised"""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return self.raw.write(b)
+
+    def flush(self):
+        self.raw.flush()
+
+    def close(self):
+        self.flush()
+
+
+class FileReader(io.RawIOBase):
+    """
+    Read-only raw view of an open file. st.download_button accepts raw
+    streams, so a spooled export can be handed over without first being
+    copied into a bytes object here.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.raw.seek(offset, whence)
+
+    def readinto(self, b):
+        data = self.raw.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def _chunks(df, chunk_rows: int):
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _write_csv(df, stream, chunk_rows: int):
+    for i, chunk in enumerate(_chunks(df, chunk_rows)):
+        stream.write(chunk.to_csv(index=False, header=(i == 0)).encode("utf-8"))
+
+
+def export_frame(df, fmt: str = 'csv', chunk_rows: int = 100_000, spool_limit: int = SPOOL_LIMIT):
+    """
+    Write a frame to a spooled temporary file in ``chunk_rows`` pieces and
+    return it rewound. ``fmt`` is one of the extensions in EXPORT_FORMATS.
+    Only one chunk is ever rendered in memory at a time.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=spool_limit)
+    if fmt == 'parquet':
+        # Inferred from the whole frame: a chunk's all-None column has no type
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(_KeepOpen(out), schema, compression='zstd') as writer:
+            for chunk in _chunks(df, chunk_rows):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    elif fmt == 'csv.gz':
+        with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=6) as stream:
+            _write_csv(df, stream, chunk_rows)
+    elif fmt == 'csv.zst':
+        with pa.CompressedOutputStream(pa.PythonFile(_KeepOpen(out), mode='w'), 'zstd') as stream:
+            _write_csv(df, stream, chunk_rows)
+    elif fmt == 'csv':
+        _write_csv(df, out, chunk_rows)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    out.seek(0)
+    return out
@@ -0,0 +1,36 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# mkstemp creates files as 0600; finished files get the usual permissions
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w", **kwargs):
+    """
+    Write ``path`` through a uniquely named temporary file in the same
+    directory, renamed over ``path`` only once the block succeeds. Readers
+    never see a partial file, and concurrent writers (threads or processes)
+    never share a temporary file. Yields the open file, or with
+    ``mode=None`` the temporary path for writers that take a path.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        if mode is None:
+            os.close(fd)
+            yield tmp
+        else:
+            with os.fdopen(fd, mode, **kwargs) as f:
+                yield f
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
@@ -1,14 +1,27 @@
 import os
 import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
 import requests
 
-def load_geojson(path="assets/india_states.geojson"):
+from perf import timed, cache_event
+from fileio import atomic_write
+
+STATES_GEOJSON_URL = "https://raw.githubusercontent.com/Subhash9325/GeoJson-Data-of-Indian-States/master/Indian_States"
+DISTRICTS_GEOJSON_URL = "https://raw.githubusercontent.com/geohacker/india/master/district/india_district.geojson"
+
+
+@timed()
+def load_geojson(path="assets/india_states.geojson", url=STATES_GEOJSON_URL):
     """Load GeoJSON file, download if missing"""
     try:
         # If file doesn't exist, download it
         if not os.path.exists(path):
             os.makedirs(os.path.dirname(path), exist_ok=True)
-            url = "https://raw.githubusercontent.com/Subhash9325/GeoJson-Data-of-Indian-States/master/Indian_States"
             response = requests.get(url, timeout=10)
             if response.status_code == 200:
                 with open(path, "wb") as f:
@@ -30,48 +43,93 @@ def load_geojson(path="assets/india_states.geojson"):
         return None
 
 
-def map_state_names(df, state_col='state'):
-    """Normalize state names to match GeoJSON properties"""
-    
-    # Comprehensive state name mapping
-    state_map = {
-        # Abbreviated forms
-        'Uttar Prad': 'Uttar Pradesh',
-        'Saharanpu': 'Saharanpur',
-        'Pratapgar': 'Pratapgarh',
-        'Muzaffarn': 'Muzaffarnagar',
-        'Rae Bareli': 'Raebareli',
-        
-        # Common variations
-        'Telengana': 'Telangana',
-        'Chattisgarh': 'Chhattisgarh',
-        'Orissa': 'Odisha',
-        'Pondicherry': 'Puducherry',
-        
-        # Union Territories
-        'Delhi': 'NCT of Delhi',
-        'Andaman': 'Andaman and Nicobar Islands',
-        'Andaman & Nicobar': 'Andaman and Nicobar Islands',
-        'Andaman And Nicobar Islands': 'Andaman and Nicobar Islands',
-        'Dadra Nagar Haveli': 'Dadra and Nagar Haveli and Daman and Diu',
-        'Dadra & Nagar Haveli': 'Dadra and Nagar Haveli and Daman and Diu',
-        'Dadra And Nagar Haveli And Daman And Diu': 'Dadra and Nagar Haveli and Daman and Diu',
-        'Daman': 'Dadra and Nagar Haveli and Daman and Diu',
-        'Daman And Diu': 'Dadra and Nagar Haveli and Daman and Diu',
-        
-        # J&K variations
-        'Jammu & Kashmir': 'Jammu and Kashmir',
-        'Jammu And Kashmir': 'Jammu and Kashmir',
-        'Ladakh': 'Ladakh'
-    }
-    
-    # Normalize: strip whitespace and title case
-    df[state_col] = df[state_col].astype(str).str.strip().str.title()
-    
-    # Apply mapping
-    df[state_col] = df[state_col].replace(state_map)
-    
-    return df
+# Comprehensive state name mapping
+STATE_NAME_MAP = {
+    # Abbreviated forms
+    'Uttar Prad': 'Uttar Pradesh',
+    'Saharanpu': 'Saharanpur',
+    'Pratapgar': 'Pratapgarh',
+    'Muzaffarn': 'Muzaffarnagar',
+    'Rae Bareli': 'Raebareli',
+
+    # Common variations
+    'Telengana': 'Telangana',
+    'Chattisgarh': 'Chhattisgarh',
+    'Orissa': 'Odisha',
+    'Pondicherry': 'Puducherry',
+
+    # Union Territories
+    'Delhi': 'NCT of Delhi',
+    'Andaman': 'Andaman and Nicobar Islands',
+    'Andaman & Nicobar': 'Andaman and Nicobar Islands',
+    'Andaman And Nicobar Islands': 'Andaman and Nicobar Islands',
+    'Dadra Nagar Haveli': 'Dadra and Nagar Haveli and Daman and Diu',
+    'Dadra & Nagar Haveli': 'Dadra and Nagar Haveli and Daman and Diu',
+    'Dadra And Nagar Haveli And Daman And Diu': 'Dadra and Nagar Haveli and Daman and Diu',
+    'Daman': 'Dadra and Nagar Haveli and Daman and Diu',
+    'Daman And Diu': 'Dadra and Nagar Haveli and Daman and Diu',
+
+    # J&K variations
+    'Jammu & Kashmir': 'Jammu and Kashmir',
+    'Jammu And Kashmir': 'Jammu and Kashmir',
+    'Ladakh': 'Ladakh'
+}
+
+
+@lru_cache(maxsize=65536)
+def normalize_state_name(name):
+    """Strip, title-case and map a single raw state spelling"""
+    name = str(name).strip().title()
+    return STATE_NAME_MAP.get(name, name)
+
+
+def normalize_state_names(states: pd.Series):
+    """
+    Normalize a Series of state names, resolving each distinct value once.
+    Cost scales with the number of spellings rather than the number of rows.
+    """
+    if isinstance(states.dtype, pd.CategoricalDtype):
+        codes = states.cat.codes.to_numpy()
+        uniques = states.cat.categories
+    else:
+        codes, uniques = pd.factorize(states, use_na_sentinel=False)
+
+    resolved = [normalize_state_name(v) for v in uniques]
+    categories = pd.Index(resolved).unique()
+    new_codes = categories.get_indexer(resolved)[codes]
+    # Missing values (code -1) stringify to 'Nan' like the row-wise version
+    if (codes < 0).any():
+        categories = categories.append(pd.Index([normalize_state_name(np.nan)])).unique()
+        new_codes = np.where(codes < 0, categories.get_loc(normalize_state_name(np.nan)), new_codes)
+
+    result = pd.Categorical.from_codes(new_codes, categories)
+    if not isinstance(states.dtype, pd.CategoricalDtype):
+        result = np.asarray(result, dtype=object)
+    return pd.Series(result, index=states.index, name=states.name)
+
+
+@timed()
+def map_state_names(df, state_col='state', resolver=None):
+    """
+    Normalize state names to match GeoJSON properties.
+    With a NameResolver, names the static map misses are fuzzy-matched too.
+    Returns a new frame; the input is left untouched and its other columns
+    are shared, not copied.
+    """
+    states = normalize_state_names(df[state_col])
+    if resolver is not None:
+        states = resolver.resolve_series(states.astype(object))
+    out = df.copy(deep=False)
+    out[state_col] = states
+    return out
+
+
+def get_geojson_names(geojson, property_key):
+    """Distinct feature names for a 'properties.<key>' featureidkey"""
+    if not geojson or not property_key:
+        return []
+    key = property_key.split(".", 1)[-1]
+    return sorted({f.get('properties', {}).get(key) for f in geojson.get('features', [])} - {None})
 
 
 def get_geojson_property_key(geojson):
@@ -95,4 +153,277 @@ def get_geojson_property_key(geojson):
                 return f"properties.{key}"
     
     print("❌ Could not detect GeoJSON property key")
-    return None
\ No newline at end of file
+    return None
+
+GEO_CACHE_DIR = ".cache/geo"
+
+
+def _douglas_peucker(points: np.ndarray, tolerance: float):
+    """Iterative Douglas-Peucker; keeps the end points of the line"""
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        a, b = points[start], points[end]
+        inner = points[start + 1:end]
+        dx, dy = b - a
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dist = np.abs(dx * (inner[:, 1] - a[1]) - dy * (inner[:, 0] - a[0])) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+
+def _simplify_ring(ring, tolerance: float, precision: int):
+    """Simplified, quantised ring, or None when it collapses below a triangle"""
+    points = np.asarray(ring, dtype=float)[:, :2]
+    points = np.round(_douglas_peucker(points, tolerance), precision)
+    # Quantising can make neighbouring vertices identical
+    if len(points) > 1:
+        points = points[np.r_[True, np.any(np.diff(points, axis=0) != 0, axis=1)]]
+    if len(points) < 4:
+        return None
+    return points.tolist()
+
+
+def _simplify_polygon(rings, tolerance: float, precision: int):
+    exterior = _simplify_ring(rings[0], tolerance, precision)
+    if exterior is None:
+        return None
+    holes = [h for h in (_simplify_ring(r, tolerance, precision) for r in rings[1:]) if h is not None]
+    return [exterior] + holes
+
+
+def simplify_geometry(geometry: dict, tolerance: float = 0.01, precision: int = 3):
+    """Simplify a Polygon/MultiPolygon geometry; other types pass through"""
+    if not geometry:
+        return geometry
+    kind = geometry.get('type')
+    if kind == 'Polygon':
+        rings = _simplify_polygon(geometry['coordinates'], tolerance, precision)
+        # Never drop a whole feature: fall back to quantisation only
+        if rings is None:
+            rings = _simplify_polygon(geometry['coordinates'], 0, precision)
+        return {'type': 'Polygon', 'coordinates': rings or geometry['coordinates']}
+    if kind == 'MultiPolygon':
+        polygons = [p for p in (_simplify_polygon(poly, tolerance, precision) for poly in geometry['coordinates']) if p]
+        if not polygons and tolerance > 0:
+            return simplify_geometry(geometry, 0, precision)
+        return {'type': 'MultiPolygon', 'coordinates': polygons} if polygons else geometry
+    return geometry
+
+
+@timed()
+def simplify_geojson(geojson: dict, tolerance: float = 0.01, precision: int = 3):
+    """Copy of a FeatureCollection with simplified geometry and only its properties kept"""
+    features = [
+        {'type': 'Feature', 'properties': f.get('properties', {}),
+         'geometry': simplify_geometry(f.get('geometry'), tolerance, precision)}
+        for f in geojson.get('features', [])
+    ]
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def _geo_cache_path(path: str, tolerance: float, precision: int, cache_dir: str):
+    stat = os.stat(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}_t{tolerance:g}_p{precision}_{stat.st_size}_{stat.st_mtime_ns}.json")
+
+
+@lru_cache(maxsize=8)
+def _load_simplified(path: str, tolerance: float, precision: int, cache_dir: str, version):
+    if version is not None:
+        cache_path = _geo_cache_path(path, tolerance, precision, cache_dir)
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    cached = json.load(f)
+                cache_event('geometry_file', True)
+                return cached['geojson'], cached['property_key']
+            except Exception as e:
+                print(f"❌ Could not read geometry cache {cache_path}: {e}")
+
+    cache_event('geometry_file', False)
+    geojson = load_geojson(path)
+    if not geojson:
+        return None, None
+    simplified = simplify_geojson(geojson, tolerance, precision)
+    property_key = get_geojson_property_key(simplified)
+
+    try:
+        cache_path = _geo_cache_path(path, tolerance, precision, cache_dir)
+        with atomic_write(cache_path, encoding="utf-8") as f:
+            json.dump({'geojson': simplified, 'property_key': property_key}, f, separators=(',', ':'))
+    except Exception as e:
+        print(f"❌ Could not write geometry cache: {e}")
+    return simplified, property_key
+
+
+@timed()
+def load_simplified_geojson(path="assets/india_states.geojson", tolerance: float = 0.01, precision: int = 3,
+                            cache_dir: str = GEO_CACHE_DIR):
+    """
+    Simplified, coordinate-quantised GeoJSON plus its detected property key.
+    Results are cached on disk (keyed on the source file version) and
+    in-process, so repeated renders skip parsing and key detection.
+    """
+    try:
+        stat = os.stat(path)
+        version = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        version = None
+    geojson, property_key = _load_simplified(path, float(tolerance), int(precision), cache_dir, version)
+    if version is None:
+        # The source was downloaded on this call; key future calls on it
+        _load_simplified.cache_clear()
+    return geojson, property_key
+
+
+STATE_PROPERTY_KEYS = ['ST_NM', 'NAME_1', 'st_nm', 'state', 'State']
+DISTRICT_PROPERTY_KEYS = ['DISTRICT', 'NAME_2', 'district', 'dtname', 'District']
+
+
+def _geometry_bbox(geometry: dict):
+    """[min_lon, min_lat, max_lon, max_lat] of a Polygon/MultiPolygon"""
+    if not geometry:
+        return None
+    polygons = geometry['coordinates'] if geometry.get('type') == 'MultiPolygon' else [geometry.get('coordinates', [])]
+    points = [p[:2] for poly in polygons for ring in poly for p in ring]
+    if not points:
+        return None
+    points = np.asarray(points, dtype=float)
+    return points.min(axis=0).tolist() + points.max(axis=0).tolist()
+
+
+def _merge_bbox(boxes):
+    boxes = np.asarray([b for b in boxes if b], dtype=float)
+    if not len(boxes):
+        return None
+    return boxes[:, :2].min(axis=0).tolist() + boxes[:, 2:].max(axis=0).tolist()
+
+
+def _first_key(props: dict, candidates):
+    return next((k for k in candidates if k in props), None)
+
+
+class DistrictGeometryStore:
+    """
+    District boundaries split into one simplified file per state.
+    The all-India file is parsed once to build the split and a bounding-box
+    index; afterwards only the drilled-down state's file is read, and
+    recently used states are kept in a small LRU.
+    """
+
+    def __init__(self, path="assets/india_districts.geojson", tolerance: float = 0.005, precision: int = 3,
+                 cache_dir: str = GEO_CACHE_DIR, max_states: int = 8):
+        self.path = path
+        self.tolerance = tolerance
+        self.precision = precision
+        self.max_states = max_states
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.index = {}
+        self.state_key = self.district_key = None
+
+        if not os.path.exists(path) and not load_geojson(path, url=DISTRICTS_GEOJSON_URL):
+            return
+        name = os.path.splitext(os.path.basename(path))[0]
+        stat = os.stat(path)
+        self.split_dir = os.path.join(cache_dir, f"{name}_t{tolerance:g}_p{precision}_{stat.st_size}_{stat.st_mtime_ns}")
+        self._load_index() or self._build_index()
+
+    @property
+    def property_key(self):
+        return f"properties.{self.district_key}" if self.district_key else None
+
+    def _load_index(self):
+        index_path = os.path.join(self.split_dir, "index.json")
+        if not os.path.exists(index_path):
+            return False
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except Exception as e:
+            print(f"❌ Could not read district index {index_path}: {e}")
+            return False
+        self.index, self.state_key, self.district_key = meta['states'], meta['state_key'], meta['district_key']
+        return True
+
+    def _build_index(self):
+        geojson = load_geojson(self.path, url=DISTRICTS_GEOJSON_URL)
+        features = (geojson or {}).get('features', [])
+        if not features:
+            return False
+        props = features[0].get('properties', {})
+        self.state_key = _first_key(props, STATE_PROPERTY_KEYS)
+        self.district_key = _first_key(props, DISTRICT_PROPERTY_KEYS)
+        if not self.state_key or not self.district_key:
+            print("❌ Could not detect state/district keys in district GeoJSON")
+            return False
+
+        by_state = {}
+        for f in features:
+            state = f.get('properties', {}).get(self.state_key)
+            if state is None:
+                continue
+            geometry = simplify_geometry(f.get('geometry'), self.tolerance, self.precision)
+            by_state.setdefault(state, []).append(
+                {'type': 'Feature', 'properties': f.get('properties', {}), 'geometry': geometry})
+
+        os.makedirs(self.split_dir, exist_ok=True)
+        for i, (state, state_features) in enumerate(sorted(by_state.items())):
+            file_name = f"state_{i}.json"
+            with atomic_write(os.path.join(self.split_dir, file_name), encoding="utf-8") as f:
+                json.dump({'type': 'FeatureCollection', 'features': state_features}, f, separators=(',', ':'))
+            districts = {ft['properties'].get(self.district_key): _geometry_bbox(ft['geometry']) for ft in state_features}
+            self.index[state] = {'file': file_name, 'bbox': _merge_bbox(districts.values()),
+                                 'districts': {str(k): v for k, v in districts.items() if k is not None}}
+
+        # Index is written last so readers never see a partial split
+        with atomic_write(os.path.join(self.split_dir, "index.json"), encoding="utf-8") as f:
+            json.dump({'states': self.index, 'state_key': self.state_key, 'district_key': self.district_key}, f)
+        print(f"✅ District geometry split into {len(self.index)} states")
+        return True
+
+    def states(self):
+        return sorted(self.index)
+
+    def districts(self, state):
+        return sorted(self.index.get(state, {}).get('districts', {}))
+
+    def bbox(self, state, district=None):
+        entry = self.index.get(state, {})
+        return entry.get('districts', {}).get(district) if district else entry.get('bbox')
+
+    @timed()
+    def load_state(self, state):
+        """FeatureCollection of one state's districts, read lazily"""
+        with self._lock:
+            if state in self._lru:
+                self._lru.move_to_end(state)
+                cache_event('district_geometry', True)
+                return self._lru[state]
+        cache_event('district_geometry', False)
+        entry = self.index.get(state)
+        if not entry:
+            return None
+        with open(os.path.join(self.split_dir, entry['file']), "r", encoding="utf-8") as f:
+            geojson = json.load(f)
+        with self._lock:
+            self._lru[state] = geojson
+            while len(self._lru) > self.max_states:
+                self._lru.popitem(last=False)
+        return geojson
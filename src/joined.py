@@ -0,0 +1,102 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from preprocess import load_dataset, METRIC_COLS
+from perf import timed
+from pools import pool_context
+
+JOIN_KEYS = ['date', 'state', 'district', 'pincode']
+
+# name -> (numerator columns, denominator column)
+RATIO_METRICS = {
+    'biometric_per_enrolment': (['total_biometric'], 'total_enrolment'),
+    'demographic_per_enrolment': (['total_demographic'], 'total_enrolment'),
+    'updates_per_enrolment': (['total_biometric', 'total_demographic'], 'total_enrolment'),
+}
+
+
+def _aggregate_dataset(path: str, dataset_type: str):
+    """Per-key totals of one dataset (runs in a worker; only the aggregate is returned)"""
+    df = load_dataset(path, dataset_type)
+    keys = [k for k in JOIN_KEYS if k in df.columns]
+    metric_col = METRIC_COLS[dataset_type]
+    if metric_col not in df.columns:
+        return None
+    return df.groupby(keys, observed=True)[metric_col].sum().reset_index()
+
+
+def _align_categories(frames, col: str):
+    """Give ``col`` the same sorted categories in every frame so codes compare directly"""
+    present = [f[col] for f in frames if col in f.columns]
+    if not present:
+        return frames
+    categories = union_categoricals([s.astype('category') for s in present], ignore_order=True, sort_categories=True)
+    categories = categories.categories
+    return [f.assign(**{col: f[col].astype(pd.CategoricalDtype(categories))}) if col in f.columns else f
+            for f in frames]
+
+
+@timed()
+def join_aggregates(frames: dict):
+    """
+    Outer-join per-key totals of several datasets. Each side is indexed on
+    the shared keys and sorted once, so alignment is a merge of sorted
+    indexes rather than a hash join of row-level frames. Keys missing from
+    a dataset count as 0.
+    """
+    frames = {t: f for t, f in frames.items() if f is not None}
+    if not frames:
+        return pd.DataFrame()
+    keys = [k for k in JOIN_KEYS if all(k in f.columns for f in frames.values())]
+    aligned = list(frames.values())
+    for col in keys:
+        if col != 'date':
+            aligned = _align_categories(aligned, col)
+
+    series = []
+    for frame, dataset_type in zip(aligned, frames):
+        metric_col = METRIC_COLS[dataset_type]
+        series.append(frame.groupby(keys, observed=True)[metric_col].sum().sort_index())
+    joined = pd.concat(series, axis=1, join='outer', sort=True).fillna(0)
+    return joined.reset_index()
+
+
+@timed()
+def load_joined(paths: dict, max_workers=None):
+    """
+    Load each dataset type in ``paths`` in its own process and join them
+    at (date, state, district, pincode). Workers run at the same time, so
+    peak memory is the rows of up to ``max_workers`` datasets (all of them
+    by default); only aggregates come back, and the caller holds just the
+    joined totals. ``max_workers=1`` loads one dataset at a time.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers or len(paths) or 1, mp_context=pool_context()) as executor:
+        futures = {t: executor.submit(_aggregate_dataset, p, t) for t, p in paths.items()}
+        frames = {t: f.result() for t, f in futures.items()}
+    return join_aggregates(frames)
+
+
+def ratio_metrics(df: pd.DataFrame):
+    """Add the ratio columns whose inputs are present; 0 denominators give NaN"""
+    out = df.copy()
+    for name, (numerators, denominator) in RATIO_METRICS.items():
+        if denominator in out.columns and all(c in out.columns for c in numerators):
+            den = out[denominator].to_numpy(dtype=float)
+            num = out[numerators].sum(axis=1).to_numpy(dtype=float)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                out[name] = np.where(den > 0, num / den, np.nan)
+    return out
+
+
+def rollup_joined(joined: pd.DataFrame, keys):
+    """
+    Totals of the joined frame at a coarser level (e.g. ['state', 'district'])
+    with ratios recomputed from the summed totals, never averaged
+    """
+    value_cols = [c for c in METRIC_COLS.values() if c in joined.columns]
+    if not keys:
+        return ratio_metrics(joined[value_cols].sum().to_frame().T)
+    return ratio_metrics(joined.groupby(keys, observed=True)[value_cols].sum().reset_index())
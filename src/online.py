@@ -0,0 +1,194 @@
+"""
+Incremental trend state for daily appends.
+
+    python src/online.py --type enrolment new_rows.csv --out reports/online
+"""
+import os
+import json
+import argparse
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from preprocess import clean_frame, METRIC_COLS
+from fileio import atomic_write
+
+ONLINE_STATE_PATH = ".cache/online_state.json"
+
+# Grouping keys for each level of incremental state
+LEVELS = {
+    'national': [],
+    'state': ['state'],
+    'district': ['state', 'district'],
+}
+
+
+class SeriesState:
+    """
+    Running statistics of one daily series: Welford mean/variance over the
+    full history and a buffer of the latest values for moving averages.
+    Matches moving_average and zscore_anomalies on the full series.
+    """
+
+    def __init__(self, max_window: int = 30):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.last_date = None
+        self.buffer = deque(maxlen=max_window)
+
+    @property
+    def std(self):
+        # Population std, as StandardScaler used in the batch version
+        return float(np.sqrt(self.m2 / self.n)) if self.n else 0.0
+
+    def zscore(self, value: float):
+        std = self.std
+        return (value - self.mean) / std if std > 0 else 0.0
+
+    def moving_average(self, window: int):
+        if window > self.buffer.maxlen:
+            raise ValueError(f"Window {window} exceeds the {self.buffer.maxlen}-day buffer")
+        values = list(self.buffer)[-window:]
+        return float(np.mean(values)) if values else np.nan
+
+    def update(self, dates, values, window: int = 7):
+        """Append new days; returns their moving averages"""
+        mas = []
+        for date, value in zip(dates, values):
+            if self.last_date is not None and date <= self.last_date:
+                raise ValueError(f"Date {date} is not after the last seen date {self.last_date}")
+            value = 0.0 if pd.isna(value) else float(value)
+            self.n += 1
+            delta = value - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (value - self.mean)
+            self.buffer.append(value)
+            self.last_date = date
+            mas.append(self.moving_average(window))
+        return mas
+
+    def to_dict(self):
+        return {'n': self.n, 'mean': self.mean, 'm2': self.m2, 'max_window': self.buffer.maxlen,
+                'last_date': None if self.last_date is None else pd.Timestamp(self.last_date).isoformat(),
+                'buffer': list(self.buffer)}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        state = cls(data['max_window'])
+        state.n, state.mean, state.m2 = data['n'], data['mean'], data['m2']
+        state.last_date = None if data['last_date'] is None else pd.Timestamp(data['last_date'])
+        state.buffer.extend(data['buffer'])
+        return state
+
+
+def _series_key(level: str, key):
+    return "|".join([level] + [str(k) for k in key])
+
+
+class OnlineAnalytics:
+    """
+    Incremental moving-average and z-score state for national, state and
+    district daily series. Feeding only the newly appended rows costs
+    O(new rows); the state round-trips through a JSON file.
+    """
+
+    def __init__(self, max_window: int = 30):
+        self.max_window = max_window
+        self.series = {}
+
+    def ingest(self, rows: pd.DataFrame, value_col: str, window: int = 7, threshold: float = 2.5):
+        """
+        Fold new cleaned rows (days after everything already ingested) into
+        every level. Returns {level: frame of the new points with ma, z and
+        is_anomaly}. Z-scores use the statistics including the new days, so
+        they equal the batch scores of those days on the full history.
+        """
+        if window > self.max_window:
+            raise ValueError(f"Window {window} exceeds the {self.max_window}-day buffer")
+        rows = rows.dropna(subset=['date'])
+        batches = []
+        for level, keys in LEVELS.items():
+            if not all(k in rows.columns for k in keys):
+                continue
+            daily = rows.groupby(keys + ['date'], observed=True)[value_col].sum().reset_index()
+            for key, group in (daily.groupby(keys, observed=True, sort=False) if keys else [((), daily)]):
+                key = key if isinstance(key, tuple) else (key,)
+                batches.append((level, _series_key(level, key), group.sort_values('date')))
+
+        # Validate everything first so a rejected batch leaves the state untouched
+        for _, series_key, group in batches:
+            state = self.series.get(series_key)
+            if state is not None and state.last_date is not None and group['date'].iloc[0] <= state.last_date:
+                raise ValueError(f"{series_key}: {group['date'].iloc[0]} is not after the last seen date {state.last_date}")
+
+        frames = {}
+        for level, series_key, group in batches:
+            state = self.series.setdefault(series_key, SeriesState(self.max_window))
+            values = group[value_col].to_numpy(dtype=float)
+            ma = state.update(list(group['date']), values, window=window)
+            frames.setdefault(level, []).append(group.assign(ma=ma, z=[state.zscore(v) for v in np.nan_to_num(values)]))
+
+        results = {}
+        for level, level_frames in frames.items():
+            out = pd.concat(level_frames, ignore_index=True)
+            out['is_anomaly'] = out['z'].abs() >= threshold
+            results[level] = out
+        return results
+
+    def get(self, level: str, key=()):
+        return self.series.get(_series_key(level, key if isinstance(key, tuple) else (key,)))
+
+    def save(self, path: str = ONLINE_STATE_PATH):
+        with atomic_write(path, encoding="utf-8") as f:
+            json.dump({'max_window': self.max_window,
+                       'series': {k: s.to_dict() for k, s in self.series.items()}}, f)
+
+    @classmethod
+    def load(cls, path: str = ONLINE_STATE_PATH):
+        """Saved state, or an empty one when no file exists yet"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        online = cls(data['max_window'])
+        online.series = {k: SeriesState.from_dict(v) for k, v in data['series'].items()}
+        return online
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fold newly appended UIDAI rows into the incremental trend state")
+    parser.add_argument("files", nargs="+", help="CSVs of new days, oldest first")
+    parser.add_argument("--type", dest="dataset_type", default="enrolment", choices=list(METRIC_COLS))
+    parser.add_argument("--state", default=None, help="State file (default: one per dataset type under .cache)")
+    parser.add_argument("--window", type=int, default=7)
+    parser.add_argument("--threshold", type=float, default=2.5)
+    parser.add_argument("--out", default=None, help="Directory for the new points of each level")
+    args = parser.parse_args(argv)
+
+    state_path = args.state or f"{os.path.splitext(ONLINE_STATE_PATH)[0]}_{args.dataset_type}.json"
+    online = OnlineAnalytics.load(state_path)
+    metric_col = METRIC_COLS[args.dataset_type]
+    status = 0
+    for path in args.files:
+        rows = clean_frame(pd.read_csv(path), args.dataset_type)
+        try:
+            results = online.ingest(rows, metric_col, window=args.window, threshold=args.threshold)
+        except ValueError as e:
+            # A rejected file leaves the state untouched; later files would be out of order too
+            print(f"❌ {path}: {e}")
+            status = 1
+            break
+        for level, points in results.items():
+            print(f"✅ {path}: {len(points):,} new {level} points, {int(points['is_anomaly'].sum())} anomalies")
+            if args.out:
+                os.makedirs(args.out, exist_ok=True)
+                target = os.path.join(args.out, f"{args.dataset_type}_{level}.csv")
+                points.to_csv(target, mode="a", index=False, header=not os.path.exists(target))
+    online.save(state_path)
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,191 @@
+"""
+Lightweight per-rerun instrumentation: wall time, peak traced memory and
+cache hits/misses of named stages.
+
+    with timed("tab.trends"):
+        ...
+
+    @timed()
+    def load_dataset(...):
+        ...
+
+Records are kept per thread (one Streamlit rerun runs on one thread) and
+emitted as JSON on the ``uidai.perf`` logger at DEBUG level. Peak memory is
+only measured while tracemalloc is tracing, see enable_memory(). tracemalloc
+is process-wide: it is switched on per server (UIDAI_TRACE_MEMORY=1), and
+while several reruns or threads run at once their peaks are shared, so a
+stage's peak_mb then includes the others' allocations.
+"""
+import os
+import json
+import time
+import logging
+import functools
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import ContextDecorator, contextmanager
+
+log = logging.getLogger("uidai.perf")
+
+MEMORY_ENV = "UIDAI_TRACE_MEMORY"
+
+_local = threading.local()
+
+
+class PerfRun:
+    """Stage records and cache counters of one rerun"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.records = []
+        self.hits = Counter()
+        self.misses = Counter()
+        self.stack = []
+
+    def cache_table(self):
+        names = sorted(set(self.hits) | set(self.misses))
+        return [{'cache': n, 'hits': self.hits[n], 'misses': self.misses[n]} for n in names]
+
+
+def current_run():
+    run = getattr(_local, 'run', None)
+    if run is None:
+        run = _local.run = PerfRun()
+    return run
+
+
+def start_run():
+    """Discard the previous rerun's records on this thread"""
+    _local.run = PerfRun()
+    return _local.run
+
+
+def enable_memory(enabled: bool = True):
+    """Start or stop tracemalloc; tracing roughly doubles allocation costs"""
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def memory_from_env():
+    """Start tracemalloc when MEMORY_ENV is set to 1; never stops it, so sessions cannot turn it off for each other"""
+    if os.environ.get(MEMORY_ENV) == "1":
+        enable_memory(True)
+    return tracemalloc.is_tracing()
+
+
+class timed(ContextDecorator):
+    """
+    Context manager and decorator recording one stage. Without a name
+    (``@timed()``) the stage is named after the decorated function.
+    """
+
+    def __init__(self, name: str = None):
+        self.name = name
+
+    def __call__(self, fn):
+        if self.name is None:
+            self.name = f"{fn.__module__}.{fn.__qualname__}"
+        return super().__call__(fn)
+
+    def _recreate_cm(self):
+        # A fresh frame per call so recursive and threaded calls do not share state
+        return timed(self.name)
+
+    def __enter__(self):
+        run = current_run()
+        self.tracing = tracemalloc.is_tracing()
+        if self.tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            # Hand the peak so far to the enclosing stage before resetting it
+            if run.stack:
+                run.stack[-1].peak = max(run.stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.base, self.peak = current, current
+        run.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = seconds = time.perf_counter() - self.start
+        run = current_run()
+        if run.stack and run.stack[-1] is self:
+            run.stack.pop()
+        record = {'stage': self.name, 'seconds': seconds, 'depth': len(run.stack),
+                  'error': exc_type.__name__ if exc_type else None}
+        if self.tracing and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            record['peak_mb'] = self.peak_mb = (self.peak - self.base) / 1e6
+            if run.stack:
+                run.stack[-1].peak = max(run.stack[-1].peak, self.peak)
+        run.records.append(record)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(json.dumps(record))
+        return False
+
+
+def cache_event(name: str, hit: bool):
+    run = current_run()
+    (run.hits if hit else run.misses)[name] += 1
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(json.dumps({'cache': name, 'hit': hit}))
+
+
+@contextmanager
+def cache_lookup(name: str):
+    """Counts a hit unless a miss for ``name`` was recorded inside the block"""
+    run = current_run()
+    before = run.misses[name]
+    yield
+    if run.misses[name] == before:
+        cache_event(name, True)
+
+
+def tracked_cache(name: str, cache):
+    """
+    Wrap a caching decorator such as st.cache_resource(...) so each call
+    is counted as a hit or a miss and misses are timed as ``name``.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def compute(*args, **kwargs):
+            cache_event(name, False)
+            with timed(name):
+                return fn(*args, **kwargs)
+
+        cached = cache(compute)
+
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            with cache_lookup(name):
+                return cached(*args, **kwargs)
+
+        call.clear = getattr(cached, 'clear', None)
+        return call
+    return decorate
+
+
+def summary(run: PerfRun = None):
+    """Stage records of a run totalled per stage, slowest first"""
+    run = run or current_run()
+    stages = {}
+    for record in run.records:
+        entry = stages.setdefault(record['stage'], {'stage': record['stage'], 'calls': 0, 'seconds': 0.0,
+                                                    'peak_mb': None, 'depth': record['depth']})
+        entry['calls'] += 1
+        entry['seconds'] += record['seconds']
+        if record.get('peak_mb') is not None:
+            entry['peak_mb'] = max(entry['peak_mb'] or 0.0, record['peak_mb'])
+        entry['depth'] = min(entry['depth'], record['depth'])
+    return sorted(stages.values(), key=lambda e: e['seconds'], reverse=True)
+
+
+def log_run(run: PerfRun = None, level: int = logging.INFO, task: str = None):
+    """Emit the run's per-stage totals and cache counters as one JSON log line"""
+    run = run or current_run()
+    record = {'started': run.started, 'stages': summary(run), 'caches': run.cache_table()}
+    if task is not None:
+        record['task'] = task
+    log.log(level, json.dumps(record))
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+from perf import timed
+
+LOCATION_KEYS = ['state', 'district', 'pincode']
+
+
+@timed()
+def pincode_daily(df: pd.DataFrame, value_col: str):
+    """Long (state, district, pincode, date) totals, the input of PincodeIndex"""
+    if not all(k in df.columns for k in LOCATION_KEYS + ['date']):
+        return pd.DataFrame(columns=LOCATION_KEYS + ['date', value_col])
+    return (df.dropna(subset=['date'])
+              .groupby(LOCATION_KEYS + ['date'], observed=True)[value_col].sum()
+              .reset_index())
+
+
+def _smallest_uint(max_value):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+class PincodeIndex:
+    """
+    Per-pincode daily counts as one dense (pincode x day) matrix of the
+    smallest unsigned dtype that fits. Rows are sorted by state, district
+    and pincode, so every state or district is a contiguous slice, and a
+    separate sort by code makes 6-digit prefix lookups a binary search.
+    Top-K, range and drop queries only touch the selected rows and days.
+    """
+
+    def __init__(self, keys: pd.DataFrame, counts: np.ndarray, start: pd.Timestamp):
+        self.keys = keys.reset_index(drop=True)
+        self.counts = counts
+        self.start = pd.Timestamp(start)
+        self.codes = pd.to_numeric(self.keys['pincode'].astype(str), errors='coerce').fillna(-1).to_numpy(np.int64)
+        self.by_code = np.argsort(self.codes, kind='stable')
+        self.sorted_codes = self.codes[self.by_code]
+
+        self._states, self._districts = {}, {}
+        state = self.keys['state'].astype(str).to_numpy()
+        district = self.keys['district'].astype(str).to_numpy()
+        for labels, target in ((state, self._states), (np.char.add(np.char.add(state, '|'), district), self._districts)):
+            if not len(labels):
+                continue
+            bounds = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+            starts = np.concatenate([[0], bounds])
+            ends = np.concatenate([bounds, [len(labels)]])
+            for s, e in zip(starts, ends):
+                target[labels[s]] = (s, e)
+
+    @classmethod
+    def from_daily(cls, daily: pd.DataFrame, value_col: str):
+        """Build from pincode_daily output"""
+        daily = daily.dropna(subset=['date'])
+        if daily.empty:
+            return cls(pd.DataFrame(columns=LOCATION_KEYS), np.zeros((0, 0), dtype=np.uint8), pd.Timestamp.today())
+        # Sorted (state, district, pincode) groups, so states and districts are contiguous
+        groups = daily.groupby(LOCATION_KEYS, observed=True, sort=True)
+        row_ids = groups.ngroup().to_numpy()
+        entities = groups.size().index.to_frame(index=False).astype(str)
+        dates = pd.DatetimeIndex(daily['date'])
+        start = dates.min().normalize()
+        days = ((dates.normalize() - start) // pd.Timedelta(days=1)).to_numpy(np.int64)
+        n_days = int(days.max()) + 1
+
+        flat = row_ids * n_days + days
+        values = daily[value_col].to_numpy(dtype=float)
+        if len(np.unique(flat)) != len(flat):
+            # Several rows per (pincode, day), e.g. times within a day
+            summed = pd.Series(values).groupby(flat).sum()
+            flat, values = summed.index.to_numpy(), summed.to_numpy()
+        counts = np.zeros((len(entities), n_days), dtype=_smallest_uint(values.max()))
+        counts.reshape(-1)[flat] = values
+        return cls(entities, counts, start)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def end(self):
+        return self.start + pd.Timedelta(days=max(self.counts.shape[1] - 1, 0))
+
+    def _rows(self, state=None, district=None):
+        """Slice of rows for a state or district, or every row (a view, never a copy)"""
+        if district is not None:
+            return slice(*self._districts.get(f"{state}|{district}", (0, 0)))
+        if state is not None:
+            return slice(*self._states.get(state, (0, 0)))
+        return slice(0, len(self.keys))
+
+    def _days(self, start=None, end=None):
+        n_days = self.counts.shape[1]
+        lo = 0 if start is None else (pd.Timestamp(start).normalize() - self.start).days
+        hi = n_days if end is None else (pd.Timestamp(end).normalize() - self.start).days + 1
+        return slice(min(max(lo, 0), n_days), min(max(hi, 0), n_days))
+
+    def _frame(self, rows: np.ndarray, **columns):
+        out = self.keys.iloc[rows].reset_index(drop=True)
+        for name, values in columns.items():
+            out[name] = values
+        return out
+
+    def range_totals(self, start=None, end=None, state=None, district=None):
+        """Total per pincode between two dates (inclusive)"""
+        rows = self._rows(state, district)
+        totals = self.counts[rows, self._days(start, end)].sum(axis=1, dtype=np.uint64)
+        return self._frame(np.arange(rows.start, rows.stop), total=totals)
+
+    def top_k(self, k: int = 50, start=None, end=None, state=None, district=None, last_days=None):
+        """The ``k`` busiest pincodes, optionally over the last ``last_days`` days only"""
+        if last_days is not None:
+            start, end = self.end - pd.Timedelta(days=last_days - 1), self.end
+        rows = self._rows(state, district)
+        totals = self.counts[rows, self._days(start, end)].sum(axis=1, dtype=np.uint64)
+        rows = np.arange(rows.start, rows.stop)
+        k = min(k, len(rows))
+        if k <= 0:
+            return self._frame(rows[:0], total=totals[:0])
+        best = np.argpartition(-totals.astype(np.int64), k - 1)[:k]
+        best = best[np.argsort(-totals[best].astype(np.int64), kind='stable')]
+        return self._frame(rows[best], total=totals[best])
+
+    def prefix(self, prefix: str):
+        """Rows whose 6-digit code starts with ``prefix``"""
+        prefix = str(prefix).strip()
+        if not prefix.isdigit() or len(prefix) > 6:
+            return self.keys.iloc[:0]
+        lo = int(prefix.ljust(6, '0'))
+        hi = int(prefix.ljust(6, '9'))
+        left = np.searchsorted(self.sorted_codes, lo, side='left')
+        right = np.searchsorted(self.sorted_codes, hi, side='right')
+        return self.keys.iloc[np.sort(self.by_code[left:right])]
+
+    def series(self, pincode: str, state=None, district=None):
+        """Daily counts of one pincode (summed if it appears under several districts)"""
+        mask = self.keys['pincode'].astype(str) == str(pincode).zfill(6)
+        if state is not None:
+            mask &= self.keys['state'] == state
+        if district is not None:
+            mask &= self.keys['district'] == district
+        values = self.counts[mask.to_numpy()].sum(axis=0, dtype=np.uint64)
+        return pd.DataFrame({'date': pd.date_range(self.start, periods=len(values), freq='D'), 'count': values})
+
+    def drops(self, window: int = 30, baseline: int = 90, threshold: float = 2.5, state=None, district=None):
+        """
+        Pincodes whose mean over the last ``window`` days fell at least
+        ``threshold`` standard errors below their daily mean over the
+        ``baseline`` days before it: the daily std scaled by
+        sqrt(1/window + 1/baseline), the standard error of the difference
+        of the two means. Most negative score first.
+        """
+        n_days = self.counts.shape[1]
+        sl = self._rows(state, district)
+        rows = np.arange(sl.start, sl.stop)
+        if n_days <= window or not len(rows):
+            return self._frame(rows[:0], recent=[], baseline=[], score=[])
+        history = self.counts[sl, max(n_days - window - baseline, 0):n_days - window].astype(float)
+        recent = self.counts[sl, n_days - window:].mean(axis=1)
+        mean, std = history.mean(axis=1), history.std(axis=1)
+        stderr = std * np.sqrt(1 / window + 1 / history.shape[1])
+        score = np.zeros(len(rows))
+        np.divide(recent - mean, stderr, out=score, where=stderr > 0)
+        flagged = np.flatnonzero(score <= -threshold)
+        flagged = flagged[np.argsort(score[flagged], kind='stable')]
+        return self._frame(rows[flagged], recent=recent[flagged], baseline=mean[flagged], score=score[flagged])
@@ -0,0 +1,12 @@
+import multiprocessing
+
+
+def pool_context():
+    """
+    Start method for worker processes. The dashboard runs inside a
+    multithreaded server, where forking can copy locks held by other
+    threads, so workers come from a fork server (or are spawned where
+    that is unavailable), never forked from the caller.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
@@ -1,7 +1,69 @@
+import os
+import glob
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
 import pandas as pd
 
-def load_dataset(path: str, dataset_type: str):
-    df = pd.read_csv(path)
+from perf import timed, cache_event
+from fileio import atomic_write
+from pools import pool_context
+
+log = logging.getLogger("uidai.preprocess")
+
+SNAPSHOT_DIR = ".cache/snapshots"
+# Bump when the cleaning logic below changes so stale snapshots are ignored
+SNAPSHOT_VERSION = 3
+
+# Dtype plan: location columns are dictionary-encoded, pincodes are stored as
+# categorical 6-digit strings and count columns use the smallest unsigned int
+CATEGORICAL_COLS = ['state', 'district', 'pincode']
+
+DEFAULT_PATHS = {
+    "enrolment": "data/processed/enrollment_clean.csv",
+    "biometric": "data/processed/biometric_clean.csv",
+    "demographic": "data/processed/demographic_clean.csv"
+}
+# Derived total column of each dataset type
+METRIC_COLS = {'enrolment': 'total_enrolment', 'biometric': 'total_biometric', 'demographic': 'total_demographic'}
+
+# Sources at least this large are aggregated chunk by chunk instead of loaded whole
+CHUNKED_MIN_BYTES = 1 << 30
+
+
+def dataset_version(path: str, dataset_type: str = ""):
+    """
+    Cheap version key for a source file (or every file of a directory/glob):
+    path, size, mtime and dataset type
+    """
+    paths = dataset_files(path)
+    if not paths:
+        raise FileNotFoundError(path)
+    keys = []
+    for p in paths:
+        stat = os.stat(p)
+        keys.append(f"{os.path.abspath(p)}|{stat.st_size}|{stat.st_mtime_ns}")
+    key = "|".join(keys + [dataset_type, str(SNAPSHOT_VERSION)])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _snapshot_prefix(path: str, dataset_type: str, cache_dir: str):
+    name = os.path.splitext(os.path.basename(path))[0]
+    path_key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{name}_{path_key}_{dataset_type}_")
+
+
+def snapshot_path(path: str, dataset_type: str, cache_dir: str = SNAPSHOT_DIR):
+    """Location of the preprocessed Parquet snapshot for a source file"""
+    prefix = _snapshot_prefix(path, dataset_type, cache_dir)
+    return f"{prefix}{dataset_version(path, dataset_type)}.parquet"
+
+
+def clean_frame(df: pd.DataFrame, dataset_type: str):
+    """Normalise columns and derive totals for a raw UIDAI frame"""
     df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
 
     # Standardize date
@@ -13,9 +75,9 @@ def load_dataset(path: str, dataset_type: str):
         if col in df.columns:
             df[col] = df[col].astype(str).str.strip().str.title()
 
-    # Clean pincode
+    # Clean pincode (formatted once per distinct value, not per row)
     if 'pincode' in df.columns:
-        df['pincode'] = df['pincode'].astype(str).str.zfill(6)
+        df['pincode'] = encode_pincodes(df['pincode'])
 
     # Fill missing numeric values
     numeric_cols = df.select_dtypes(include='number').columns
@@ -42,3 +104,297 @@ def load_dataset(path: str, dataset_type: str):
             print("No demographic columns found.")
 
     return df
+
+
+def encode_pincodes(pincodes: pd.Series):
+    """Zero-pad pincodes to 6 digits as a categorical"""
+    codes, uniques = pd.factorize(pincodes, sort=True)
+    categories = pd.Index(uniques).astype(str).str.zfill(6)
+    if not categories.is_unique:
+        return pd.Series(categories.take(codes), index=pincodes.index).astype('category')
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index=pincodes.index)
+
+
+def compact_frame(df: pd.DataFrame):
+    """Apply the dtype plan in place: categoricals and downcast unsigned counts"""
+    for col in CATEGORICAL_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+
+    for col in value_columns(df):
+        values = df[col]
+        if values.dtype.kind in 'iuf' and len(values) and values.min() >= 0:
+            df[col] = pd.to_numeric(values, downcast='unsigned')
+    return df
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame):
+    """Per-column dtype and memory footprint before and after compaction"""
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'bytes_before': before.memory_usage(deep=True, index=False),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_after': after.memory_usage(deep=True, index=False),
+    })
+    report['ratio'] = (report['bytes_before'] / report['bytes_after'].clip(lower=1)).round(2)
+    report.index.name = 'column'
+    return report
+
+
+def dataset_files(path: str):
+    """Source CSVs for a file, a directory of CSVs or a glob pattern"""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(glob.escape(path), "*.csv")))
+    if glob.has_magic(path):
+        return sorted(p for p in glob.glob(path) if os.path.isfile(p))
+    return [path]
+
+
+def source_bytes(path: str):
+    """Total size of a source's CSVs"""
+    return sum(os.path.getsize(p) for p in dataset_files(path) if os.path.exists(p))
+
+
+def _parquet_filters(date_range=None, states=None):
+    filters = []
+    if date_range is not None:
+        start, end = date_range
+        if start is not None:
+            filters.append(('date', '>=', pd.Timestamp(start)))
+        if end is not None:
+            filters.append(('date', '<=', pd.Timestamp(end)))
+    if states is not None:
+        filters.append(('state', 'in', list(states)))
+    return filters or None
+
+
+def _mask_frame(df: pd.DataFrame, date_range=None, states=None):
+    """Row filter equivalent to the Parquet pushdown filters"""
+    mask = pd.Series(True, index=df.index)
+    if date_range is not None and 'date' in df.columns:
+        start, end = date_range
+        if start is not None:
+            mask &= df['date'] >= pd.Timestamp(start)
+        if end is not None:
+            mask &= df['date'] <= pd.Timestamp(end)
+    if states is not None and 'state' in df.columns:
+        mask &= df['state'].isin(list(states))
+    return df if mask.all() else df[mask].reset_index(drop=True)
+
+
+@timed()
+def filter_frame(df: pd.DataFrame, date_range=None, states=None, districts=None):
+    """
+    Rows of a date-sorted frame (as returned by load_dataset) within
+    ``date_range`` and the given states/districts. The date range is found
+    by binary search and locations are matched on categorical codes, so only
+    the rows inside the range are touched.
+    """
+    if date_range is not None and 'date' in df.columns:
+        dates = df['date'].to_numpy()
+        start, end = date_range
+        lo = 0 if start is None else dates.searchsorted(pd.Timestamp(start).to_datetime64(), side='left')
+        hi = len(df) if end is None else dates.searchsorted(pd.Timestamp(end).to_datetime64(), side='right')
+        df = df.iloc[lo:hi]
+
+    mask = None
+    for col, selected in (('state', states), ('district', districts)):
+        if selected is None or col not in df.columns:
+            continue
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            wanted = values.cat.categories.get_indexer(list(selected))
+            col_mask = np.isin(values.cat.codes.to_numpy(), wanted[wanted >= 0])
+        else:
+            col_mask = values.isin(list(selected)).to_numpy()
+        mask = col_mask if mask is None else mask & col_mask
+    return df if mask is None else df[mask]
+
+
+def _read_snapshot(snap: str, filters=None):
+    try:
+        return pd.read_parquet(snap, memory_map=True, filters=filters)
+    except Exception as e:
+        print(f"❌ Could not read snapshot {snap}: {e}")
+        return None
+
+
+def _write_snapshot(df: pd.DataFrame, snap: str):
+    try:
+        with atomic_write(snap, mode=None) as tmp:
+            df.to_parquet(tmp, index=False)
+    except Exception as e:
+        print(f"❌ Could not write snapshot {snap}: {e}")
+
+
+def _parse_file(path: str, dataset_type: str):
+    df = clean_frame(pd.read_csv(path), dataset_type)
+    # Date order lets filters binary-search rows and Parquet skip row groups
+    if 'date' in df.columns:
+        df = df.sort_values('date', kind='stable', ignore_index=True)
+    # compact_frame replaces columns, so a shallow copy keeps the originals
+    before = df.copy(deep=False)
+    df = compact_frame(df)
+    report = memory_report(before, df)
+    print(f"✅ Compacted {path}: {report['bytes_before'].sum() / 1e6:.1f} MB -> "
+          f"{report['bytes_after'].sum() / 1e6:.1f} MB")
+    log.info("Memory per column of %s:\n%s", path, report.to_string())
+    return df
+
+
+def _store_snapshot(df: pd.DataFrame, path: str, dataset_type: str, cache_dir: str):
+    snap = snapshot_path(path, dataset_type, cache_dir)
+    _write_snapshot(df, snap)
+    # Drop snapshots of older versions of the same source file
+    for stale in glob.glob(glob.escape(_snapshot_prefix(path, dataset_type, cache_dir)) + "*.parquet"):
+        if stale != snap:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def _cache_file(path: str, dataset_type: str, cache_dir: str):
+    """Build a file's snapshot if missing (runs in worker processes)"""
+    if not os.path.exists(snapshot_path(path, dataset_type, cache_dir)):
+        _store_snapshot(_parse_file(path, dataset_type), path, dataset_type, cache_dir)
+
+
+def _load_file(path: str, dataset_type: str, use_cache: bool, cache_dir: str, date_range=None, states=None):
+    snap = snapshot_path(path, dataset_type, cache_dir) if use_cache else None
+    if snap and os.path.exists(snap):
+        df = _read_snapshot(snap, _parquet_filters(date_range, states))
+        if df is not None:
+            cache_event('snapshot', True)
+            return df
+    if snap:
+        cache_event('snapshot', False)
+
+    df = _parse_file(path, dataset_type)
+    if snap:
+        _store_snapshot(df, path, dataset_type, cache_dir)
+    return _mask_frame(df, date_range, states)
+
+
+@timed()
+def load_dataset(path: str, dataset_type: str, use_cache: bool = True, cache_dir: str = SNAPSHOT_DIR,
+                 date_range=None, states=None, max_workers=None):
+    """
+    Load and clean a UIDAI CSV, a directory of CSVs or a glob of CSVs.
+    Each cleaned file is snapshotted to Parquet on first load and reused while
+    its path, size, mtime and dataset type are unchanged. Multiple files are
+    parsed in parallel and concatenated in date order. ``date_range``
+    (start, end) and ``states`` are pushed down to the snapshots so
+    non-matching row groups and files are skipped.
+    """
+    paths = dataset_files(path)
+    if not paths:
+        raise FileNotFoundError(path)
+    if len(paths) == 1:
+        return _load_file(paths[0], dataset_type, use_cache, cache_dir, date_range, states)
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=pool_context()) as executor:
+        if use_cache:
+            pending = [p for p in paths if not os.path.exists(snapshot_path(p, dataset_type, cache_dir))]
+            list(executor.map(_cache_file, pending, repeat(dataset_type), repeat(cache_dir)))
+            frames = [_load_file(p, dataset_type, use_cache, cache_dir, date_range, states) for p in paths]
+        else:
+            frames = [_mask_frame(df, date_range, states)
+                      for df in executor.map(_parse_file, paths, repeat(dataset_type))]
+
+    # Pruned files come back empty; keep one so the columns survive
+    frames = [f for f in frames if len(f)] or frames[:1]
+    # Categories differ between files, so re-encode after concatenating
+    df = compact_frame(pd.concat(frames, ignore_index=True))
+    if 'date' in df.columns:
+        df = df.sort_values('date', kind='stable', ignore_index=True)
+    return df
+
+
+AGGREGATE_KEYS = {
+    'date': ['date'],
+    'state': ['state'],
+    'district': ['state', 'district'],
+    'state_date': ['state', 'date'],
+    'district_date': ['state', 'district', 'date'],
+    'total': [],
+}
+
+
+def value_columns(df: pd.DataFrame):
+    """Numeric count columns that can be summed in aggregate tables"""
+    return [c for c in df.select_dtypes(include='number').columns if c != 'pincode']
+
+
+@timed()
+def aggregate_frame(df: pd.DataFrame, value_cols=None):
+    """
+    Sum value columns into date, state, district, state x date and
+    district x date tables, plus a one-row grand 'total', grouping once at
+    the finest grain and rolling the coarser tables up from it. A
+    'records' column carries the row count of each group.
+    """
+    grain, base = _grain_totals(df, value_cols)
+    return _rollup_tables(base, grain)
+
+
+def _grain_totals(df: pd.DataFrame, value_cols=None):
+    """Value sums and row counts at the finest (state, district, date) grain present"""
+    if value_cols is None:
+        value_cols = value_columns(df)
+    value_cols = [c for c in value_cols if c != 'records']
+    grain = [c for c in ['state', 'district', 'date'] if c in df.columns]
+    if not grain:
+        return grain, None
+    base = df[grain + value_cols].assign(records=1)
+    return grain, base.groupby(grain, dropna=False, observed=True, sort=False).sum().reset_index()
+
+
+def _rollup_tables(base: pd.DataFrame, grain):
+    if not grain:
+        return {}
+    tables = {}
+    for name, keys in AGGREGATE_KEYS.items():
+        if all(k in grain for k in keys):
+            tables[name] = _rollup(base, keys)
+    return tables
+
+
+def _rollup(table: pd.DataFrame, keys):
+    if not keys:
+        return table.sum(numeric_only=True).to_frame().T
+    return table.groupby(keys, observed=True).sum(numeric_only=True).reset_index()
+
+
+def _sum_partials(partials, grain):
+    combined = pd.concat(partials, ignore_index=True)
+    return combined.groupby(grain, dropna=False, observed=True, sort=False).sum().reset_index()
+
+
+@timed()
+def load_aggregates(path: str, dataset_type: str, chunksize: int = 500_000):
+    """
+    Stream a CSV (or each CSV of a directory or glob) in fixed-size chunks
+    and return only the aggregate tables. Peak memory is bounded by the
+    chunk size plus the aggregate tables, so this works on sources that do
+    not fit in RAM.
+    """
+    paths = dataset_files(path)
+    if not paths:
+        raise FileNotFoundError(path)
+    grain, partials, pending, merged = [], [], 0, 0
+    for file in paths:
+        for chunk in pd.read_csv(file, chunksize=chunksize):
+            grain, base = _grain_totals(clean_frame(chunk, dataset_type))
+            if base is None:
+                continue
+            partials.append(base)
+            pending += len(base)
+            # Fold the per-chunk partials only once they outgrow the merged
+            # total, so each row is re-grouped O(log chunks) times at most
+            if pending > max(merged, chunksize):
+                partials = [_sum_partials(partials, grain)]
+                pending = merged = len(partials[0])
+    if not partials:
+        return {}
+    return _rollup_tables(_sum_partials(partials, grain), grain)
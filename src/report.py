@@ -0,0 +1,154 @@
+"""
+Headless batch report: runs the dashboard analytics for every dataset type
+and writes tables and standalone HTML figures to an output directory.
+
+    python src/report.py --out reports
+"""
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from preprocess import load_dataset, load_aggregates, dataset_version, aggregate_frame, DEFAULT_PATHS, METRIC_COLS
+from cube import AggregateCube
+from store import ResultsStore, RESULTS_DIR
+from analytics import daily_trend, arima_forecast, batch_forecast, panel_anomalies
+from charts import trend_figure, forecast_figure, top_states_figure
+
+
+def dataset_report(cube: AggregateCube, metric_col: str, ma_window: int = 7, threshold: float = 2.5,
+                   forecast_steps: int = 7, max_workers=None, store=None, version=None):
+    """
+    Every table the dashboard shows for one dataset, keyed by name.
+    ``max_workers`` is passed to the per-state batch forecast. With a dataset
+    version, results are read from and written to the store under the same
+    names and parameters the dashboard uses.
+    """
+    store = store or ResultsStore()
+
+    def result(name, params, compute):
+        return store.get_or_compute(version, name, dict(params, metric=metric_col), compute)
+
+    records = max(cube.records, 1)
+    tables = {'kpis': pd.DataFrame([{
+        'records': cube.records,
+        'metric': metric_col,
+        'total': cube.total(metric_col),
+        'average': cube.total(metric_col) / records,
+        'states': cube.n_states,
+        'districts': cube.n_districts,
+    }])}
+
+    if cube.has('date'):
+        ts = result('timeseries', {'window': ma_window, 'threshold': threshold},
+                    lambda: daily_trend(cube.by_date(metric_col), metric_col, window=ma_window, threshold=threshold))
+        tables['timeseries'] = ts
+        tables['anomalies'] = ts[ts['is_anomaly']]
+        tables['forecast'] = result('forecast', {'steps': forecast_steps}, lambda: arima_forecast(
+            ts[['date', metric_col]].rename(columns={metric_col: 'value'}), 'value', steps=forecast_steps))
+    if cube.has('state'):
+        tables['state_rankings'] = cube.by_state(metric_col).sort_values(metric_col, ascending=False)
+    if cube.has('state_date'):
+        state_panel = cube.by_state_date(metric_col)
+        tables['state_anomalies'] = result('state_anomalies', {'method': 'zscore', 'threshold': threshold},
+                                           lambda: panel_anomalies(state_panel, 'state', metric_col, threshold=threshold))
+        tables['state_forecasts'] = result('state_forecasts', {'steps': forecast_steps}, lambda: batch_forecast(
+            state_panel, 'state', metric_col, steps=forecast_steps, max_workers=max_workers))
+    if cube.has('district_date'):
+        tables['district_anomalies'] = result('district_anomalies', {'method': 'zscore', 'threshold': threshold},
+                                              lambda: panel_anomalies(cube.by_district_date(metric_col),
+                                                                      ['state', 'district'], metric_col,
+                                                                      threshold=threshold))
+    return tables
+
+
+def report_figures(tables: dict, metric_col: str, ma_window: int, forecast_steps: int):
+    figures = {}
+    if 'timeseries' in tables:
+        figures['trend'] = trend_figure(tables['timeseries'], metric_col, ma_window)
+        figures['forecast'] = forecast_figure(tables['timeseries'], tables['forecast'], metric_col, forecast_steps)
+    if 'state_rankings' in tables:
+        figures['top_states'] = top_states_figure(tables['state_rankings'], metric_col)
+    return figures
+
+
+def load_cube(path: str, dataset_type: str, store: ResultsStore, version: str, chunked: bool = False):
+    """
+    Aggregate tables of a dataset version, parsing the source only on a
+    store miss. ``chunked`` streams the CSVs instead of loading every row.
+    """
+    tables = store.get_tables(version, 'aggregates')
+    if tables is None:
+        if chunked:
+            tables = load_aggregates(path, dataset_type)
+        else:
+            tables = aggregate_frame(load_dataset(path, dataset_type))
+        tables = store.put_tables(version, 'aggregates', tables)
+    return AggregateCube(tables)
+
+
+def run_dataset(dataset_type: str, path: str, out_dir: str, ma_window: int = 7, threshold: float = 2.5,
+                forecast_steps: int = 7, max_workers=None, results_dir: str = RESULTS_DIR, chunked: bool = False):
+    """Load one dataset, write its tables and figures and return a summary"""
+    metric_col = METRIC_COLS[dataset_type]
+    store = ResultsStore(results_dir)
+    version = dataset_version(path, dataset_type)
+    cube = load_cube(path, dataset_type, store, version, chunked)
+    tables = dataset_report(cube, metric_col, ma_window, threshold, forecast_steps, max_workers, store, version)
+
+    target = os.path.join(out_dir, dataset_type)
+    os.makedirs(target, exist_ok=True)
+    for name, table in tables.items():
+        table.to_csv(os.path.join(target, f"{name}.csv"), index=False)
+    for name, fig in report_figures(tables, metric_col, ma_window, forecast_steps).items():
+        # HTML needs no image export backend; the figures share one plotly.min.js
+        # next to them, so the report also renders offline
+        fig.write_html(os.path.join(target, f"{name}.html"), include_plotlyjs='directory')
+
+    print(f"✅ {dataset_type}: {len(tables)} tables written to {target}")
+    return {'dataset_type': dataset_type, 'path': path, 'version': version, 'tables': sorted(tables),
+            'records': cube.records, 'total': float(cube.total(metric_col))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute UIDAI dashboard analytics")
+    parser.add_argument("--out", default="reports", help="Output directory")
+    parser.add_argument("--types", nargs="+", default=list(DEFAULT_PATHS), choices=list(DEFAULT_PATHS))
+    for dataset_type, path in DEFAULT_PATHS.items():
+        parser.add_argument(f"--{dataset_type}", default=path, help=f"{dataset_type} CSV, folder or glob")
+    parser.add_argument("--ma-window", type=int, default=7)
+    parser.add_argument("--threshold", type=float, default=2.5)
+    parser.add_argument("--forecast-steps", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes per dataset forecast")
+    parser.add_argument("--results-dir", default=RESULTS_DIR, help="Results store shared with the dashboard")
+    parser.add_argument("--chunked", action="store_true",
+                        help="Stream sources in chunks for files larger than memory")
+    args = parser.parse_args(argv)
+
+    jobs = {t: getattr(args, t) for t in args.types}
+    missing = [p for p in jobs.values() if not os.path.exists(p) and not any(c in p for c in "*?[")]
+    for path in missing:
+        print(f"❌ File not found: {path}")
+    jobs = {t: p for t, p in jobs.items() if p not in missing}
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=len(jobs) or 1) as executor:
+        futures = {t: executor.submit(run_dataset, t, p, args.out, args.ma_window, args.threshold,
+                                      args.forecast_steps, args.workers, args.results_dir, args.chunked)
+                   for t, p in jobs.items()}
+        for dataset_type, future in futures.items():
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                print(f"❌ {dataset_type} failed: {e}")
+
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summaries, f, indent=2)
+    return 0 if len(summaries) == len(args.types) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from fileio import atomic_write
+
+RESOLVER_CACHE_DIR = ".cache/resolver"
+MIN_DICE = 0.3
+
+
+def name_key(name):
+    """Canonical lookup key: lower case, '&' as 'and', alphanumerics only"""
+    key = str(name).lower().replace("&", " and ")
+    return re.sub(r"[^a-z0-9]+", " ", key).strip()
+
+
+def _ngrams(key: str, n: int = 3):
+    padded = f"  {key} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class NameResolver:
+    """
+    Match messy place names against a fixed set of canonical names.
+    Exact keys and aliases are dictionary hits; anything else is scored
+    against a sparse trigram index and confirmed with edit-distance
+    similarity. Every decision is cached and can be persisted, so repeated
+    loads are O(1) per name. Instances are shared between sessions; the
+    decision cache is guarded by a lock.
+    """
+
+    def __init__(self, canonical_names, aliases=None, label="names", min_score=0.82,
+                 cache_dir=RESOLVER_CACHE_DIR, max_candidates=2):
+        self.canonical = sorted({str(n) for n in canonical_names if pd.notna(n)})
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+        self.exact = {name_key(n): n for n in self.canonical}
+        self.aliases = {name_key(k): v for k, v in (aliases or {}).items()}
+
+        self.keys = [name_key(n) for n in self.canonical]
+        self.vocab = {}
+        self.index = self._gram_matrix(self.keys, grow=True)
+        self.index_sizes = np.asarray(self.index.sum(axis=1)).ravel()
+
+        digest = hashlib.sha1(json.dumps([self.canonical, sorted(self.aliases.items()), min_score]).encode("utf-8"))
+        self.cache_path = os.path.join(cache_dir, f"{label}_{digest.hexdigest()[:12]}.json") if cache_dir else None
+        self.decisions = self._load()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def _load(self):
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"❌ Could not read resolver cache {self.cache_path}: {e}")
+        return {}
+
+    def save(self):
+        """Persist cached decisions; a no-op when nothing new was resolved"""
+        if not self.cache_path:
+            return
+        # One writer at a time; resolving only waits for the snapshot copy
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                decisions = dict(self.decisions)
+                self._dirty = False
+            try:
+                with atomic_write(self.cache_path, encoding="utf-8") as f:
+                    json.dump(decisions, f)
+            except Exception as e:
+                with self._lock:
+                    self._dirty = True
+                print(f"❌ Could not write resolver cache {self.cache_path}: {e}")
+
+    def _gram_matrix(self, keys, grow=False):
+        """Sparse binary (keys x trigrams) matrix over the canonical vocabulary"""
+        rows, cols = [], []
+        for r, key in enumerate(keys):
+            for gram in _ngrams(key):
+                col = self.vocab.get(gram)
+                if col is None and grow:
+                    col = self.vocab[gram] = len(self.vocab)
+                if col is not None:
+                    rows.append(r)
+                    cols.append(col)
+        data = np.ones(len(rows), dtype=np.float32)
+        return sparse.csr_matrix((data, (rows, cols)), shape=(len(keys), len(self.vocab)))
+
+    def _match_many(self, keys):
+        """Exact and alias hits first, then one batched fuzzy pass for the rest"""
+        matches, pending = {}, []
+        for key in keys:
+            if key in self.exact:
+                matches[key] = self.exact[key]
+            elif key in self.aliases:
+                alias_key = name_key(self.aliases[key])
+                if alias_key in self.exact:
+                    matches[key] = self.exact[alias_key]
+                else:
+                    pending.append((key, alias_key))
+            else:
+                pending.append((key, key))
+        if pending:
+            found = self._fuzzy_many([target for _, target in pending])
+            matches.update({key: hit for (key, _), hit in zip(pending, found)})
+        return matches
+
+    def _fuzzy_many(self, keys, chunk_size=10_000):
+        """
+        Score keys against every canonical name by trigram Dice overlap (one
+        sparse product per chunk), then confirm the top few candidates with
+        edit-distance similarity.
+        """
+        results = []
+        k = min(self.max_candidates, len(self.keys))
+        if k == 0:
+            return [None] * len(keys)
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            query = self._gram_matrix(chunk)
+            sizes = np.array([len(_ngrams(key)) for key in chunk], dtype=np.float32)
+            overlap = (query @ self.index.T).toarray()
+            dice = 2 * overlap / (sizes[:, None] + self.index_sizes[None, :])
+            top = np.argpartition(-dice, k - 1, axis=1)[:, :k]
+            for row, key in enumerate(chunk):
+                results.append(self._confirm(key, top[row], dice[row]))
+        return results
+
+    def _confirm(self, key, candidates, dice):
+        if not key:
+            return None
+        best, best_score = None, 0.0
+        matcher = SequenceMatcher(autojunk=False)
+        matcher.set_seq2(key)
+        for i in candidates[np.argsort(-dice[candidates])]:
+            # Too few shared trigrams to be a spelling variant
+            if dice[i] < MIN_DICE:
+                continue
+            candidate = self.keys[i]
+            # Truncated spellings such as 'Uttar Prad'
+            if len(key) >= 5 and candidate.startswith(key):
+                score = 0.9
+            elif dice[i] >= 0.9:
+                score = float(dice[i])
+            else:
+                matcher.set_seq1(candidate)
+                score = matcher.ratio()
+            if score > best_score:
+                best, best_score = self.canonical[i], score
+        return best if best_score >= self.min_score else None
+
+    def resolve(self, name):
+        """Canonical name for one raw value, or None when nothing is close enough"""
+        return self.resolve_many([name])[0]
+
+    def resolve_many(self, names):
+        """Resolve a list of raw values, batching every cache miss"""
+        keys = [name_key(n) for n in names]
+        with self._lock:
+            misses = list(dict.fromkeys(k for k in keys if k not in self.decisions))
+        # Matching runs unlocked; a name matched by two threads gets the same answer
+        matches = self._match_many(misses) if misses else {}
+        with self._lock:
+            if matches:
+                self.decisions.update(matches)
+                self._dirty = True
+            return [self.decisions[k] for k in keys]
+
+    def resolve_series(self, names: pd.Series, weights=None, with_unresolved=False):
+        """
+        Resolve a Series, touching each distinct value once. Unresolved
+        values keep their raw spelling. With ``with_unresolved`` a frame of
+        this call's unresolved names and their row (or ``weights``) totals
+        is returned too.
+        """
+        codes, uniques = pd.factorize(names)
+        resolved = self.resolve_many(list(uniques))
+        self.save()
+
+        # Trailing None is picked up by the -1 code of missing values
+        out = np.array([u if r is None else r for u, r in zip(uniques, resolved)] + [None], dtype=object)
+        result = pd.Series(out[codes], index=names.index, name=names.name)
+        if not with_unresolved:
+            return result
+
+        missing = np.flatnonzero([r is None for r in resolved])
+        w = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=float)
+        valid = codes >= 0
+        totals = np.bincount(codes[valid], weights=w[valid], minlength=len(uniques))
+        unresolved = pd.DataFrame({'name': [str(uniques[i]) for i in missing], 'count': totals[missing]})
+        return result, unresolved.sort_values('count', ascending=False, ignore_index=True)
+
+
+def district_resolvers(gazetteer: dict, **kwargs):
+    """One resolver per state from a {state: [district, ...]} gazetteer"""
+    return {state: NameResolver(districts, label=f"districts_{name_key(state).replace(' ', '_')}", **kwargs)
+            for state, districts in gazetteer.items()}
+
+
+def load_gazetteer(path: str, state_col='state', district_col='district'):
+    """Read a state/district CSV into a {state: [district, ...]} dict"""
+    df = pd.read_csv(path, usecols=[state_col, district_col]).dropna()
+    return df.groupby(state_col)[district_col].apply(lambda s: sorted(set(s))).to_dict()
@@ -0,0 +1,97 @@
+import os
+import json
+import hashlib
+
+import pandas as pd
+
+from perf import cache_event
+from fileio import atomic_write
+
+RESULTS_DIR = ".cache/results"
+
+
+def params_key(params=None):
+    """Stable short hash of a parameter dict"""
+    text = json.dumps(params or {}, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class ResultsStore:
+    """
+    File-backed store of computed frames shared by every dashboard process
+    and the batch report. Results live in <root>/<dataset version>/ as
+    Parquet files named after the result and a hash of its parameters, so
+    a changed source file or parameter simply misses.
+    """
+
+    def __init__(self, root: str = RESULTS_DIR):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, version: str, name: str, params=None):
+        return os.path.join(self.root, version, f"{name}-{params_key(params)}.parquet")
+
+    def get(self, version: str, name: str, params=None):
+        """Stored frame, or None on a miss"""
+        path = self.path(version, name, params)
+        try:
+            df = pd.read_parquet(path)
+        except Exception:
+            self.misses += 1
+            cache_event('results', False)
+            return None
+        self.hits += 1
+        cache_event('results', True)
+        return df
+
+    def put(self, version: str, name: str, df: pd.DataFrame, params=None):
+        path = self.path(version, name, params)
+        try:
+            with atomic_write(path, mode=None) as tmp:
+                df.to_parquet(tmp, index=False)
+        except Exception as e:
+            # The store is an optimisation; a failed write only costs a recompute later
+            print(f"❌ Could not store {name}: {e}")
+        return df
+
+    def get_or_compute(self, version, name: str, params, compute):
+        """
+        Read a result, computing and storing it on a miss. A version of None
+        (e.g. a filtered view) always computes and stores nothing.
+        """
+        if version is None:
+            return compute()
+        df = self.get(version, name, params)
+        if df is None:
+            df = self.put(version, name, compute(), params)
+        return df
+
+    def get_tables(self, version: str, name: str):
+        """A set of tables stored with put_tables, or None if any is missing"""
+        manifest = os.path.join(self.root, version, f"{name}.json")
+        try:
+            with open(manifest, "r", encoding="utf-8") as f:
+                names = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            cache_event('results', False)
+            return None
+        tables = {}
+        for table in names:
+            df = self.get(version, f"{name}.{table}")
+            if df is None:
+                return None
+            tables[table] = df
+        return tables
+
+    def put_tables(self, version: str, name: str, tables: dict):
+        for table, df in tables.items():
+            self.put(version, f"{name}.{table}", df)
+        # The manifest is written last so readers never see a partial set
+        try:
+            with atomic_write(os.path.join(self.root, version, f"{name}.json"), encoding="utf-8") as f:
+                json.dump(sorted(tables), f)
+        except Exception as e:
+            print(f"❌ Could not store {name} manifest: {e}")
+        return tables
@@ -0,0 +1,110 @@
+"""
+Synthetic UIDAI-shaped datasets for benchmarks.
+
+    python src/synth.py --type enrolment --rows 1000000 --out data/synthetic
+"""
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from fileio import atomic_write
+
+# Raw count columns of each dataset type, as published
+DATASET_COLUMNS = {
+    'enrolment': ['age_0_5', 'age_5_17', 'age_18_greater'],
+    'biometric': ['bio_age_5_17', 'bio_age_17_'],
+    'demographic': ['demo_age_5_17', 'demo_age_17_'],
+}
+
+# Includes the variant spellings seen in the source files
+STATES = [
+    'Andhra Pradesh', 'Arunachal Pradesh', 'Assam', 'Bihar', 'Chhattisgarh', 'Chattisgarh', 'Goa', 'Gujarat',
+    'Haryana', 'Himachal Pradesh', 'Jharkhand', 'Karnataka', 'Kerala', 'Madhya Pradesh', 'Maharashtra', 'Manipur',
+    'Meghalaya', 'Mizoram', 'Nagaland', 'Odisha', 'Orissa', 'Punjab', 'Rajasthan', 'Sikkim', 'Tamil Nadu',
+    'Telangana', 'Telengana', 'Tripura', 'Uttar Pradesh', 'Uttarakhand', 'West Bengal', 'Delhi',
+    'Jammu & Kashmir', 'Jammu And Kashmir', 'Ladakh', 'Puducherry', 'Pondicherry', 'Chandigarh',
+    'Andaman & Nicobar', 'Dadra & Nagar Haveli', 'Lakshadweep',
+]
+
+# Mean daily count per row for each raw column
+COLUMN_MEANS = {
+    'age_0_5': 25, 'age_5_17': 20, 'age_18_greater': 30,
+    'bio_age_5_17': 15, 'bio_age_17_': 60,
+    'demo_age_5_17': 10, 'demo_age_17_': 120,
+}
+
+
+def _geography(n_districts: int, n_pincodes: int, rng):
+    """District -> state and pincode -> district lookups with skewed sizes"""
+    district_state = rng.integers(0, len(STATES), n_districts)
+    district_names = np.array([f"{STATES[s][:3]} District {i}" for i, s in enumerate(district_state)], dtype=object)
+    pincode_district = rng.integers(0, n_districts, n_pincodes)
+    pincodes = rng.choice(np.arange(110001, 855118), n_pincodes, replace=False)
+    # Zipf-like weights so a few pincodes dominate, as in the real data
+    weights = 1.0 / np.arange(1, n_pincodes + 1) ** 0.8
+    return district_state, district_names, pincode_district, pincodes, weights / weights.sum()
+
+
+def generate_frame(n_rows: int, dataset_type: str, start: str = "2024-01-01", days: int = 365,
+                   n_districts: int = 700, n_pincodes: int = 19_000, seed: int = 0, geography_seed: int = 0):
+    """
+    ``n_rows`` raw rows with the published column layout: date, state,
+    district, pincode and the dataset's count columns. The geography only
+    depends on ``geography_seed`` so chunks generated with different
+    ``seed`` values describe the same country.
+    """
+    if dataset_type not in DATASET_COLUMNS:
+        raise ValueError(f"Unknown dataset type: {dataset_type}")
+    district_state, district_names, pincode_district, pincodes, weights = _geography(
+        n_districts, n_pincodes, np.random.default_rng(geography_seed))
+
+    rng = np.random.default_rng(seed)
+    pin = rng.choice(len(pincodes), n_rows, p=weights)
+    district = pincode_district[pin]
+    day = rng.integers(0, days, n_rows)
+    dates = pd.Timestamp(start) + pd.to_timedelta(day, unit='D')
+    # Weekly cycle: weekends run at roughly half volume
+    seasonal = np.where(dates.dayofweek >= 5, 0.5, 1.0)
+
+    df = pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'),
+        'state': np.array(STATES, dtype=object)[district_state[district]],
+        'district': district_names[district],
+        'pincode': pincodes[pin],
+    })
+    for col in DATASET_COLUMNS[dataset_type]:
+        df[col] = rng.poisson(COLUMN_MEANS[col] * seasonal)
+    return df
+
+
+def write_csv(path: str, n_rows: int, dataset_type: str, chunk_rows: int = 1_000_000, seed: int = 0, **kwargs):
+    """
+    Write a synthetic CSV in ``chunk_rows`` pieces so sizes up to tens of
+    millions of rows never need to fit in memory at once.
+    """
+    with atomic_write(path, encoding="utf-8", newline="") as f:
+        for i, start in enumerate(range(0, n_rows, chunk_rows)):
+            chunk = generate_frame(min(chunk_rows, n_rows - start), dataset_type, seed=seed + i, **kwargs)
+            chunk.to_csv(f, index=False, header=(i == 0))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic UIDAI datasets")
+    parser.add_argument("--type", dest="types", nargs="+", default=list(DATASET_COLUMNS), choices=list(DATASET_COLUMNS))
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="data/synthetic")
+    args = parser.parse_args(argv)
+
+    for dataset_type in args.types:
+        path = os.path.join(args.out, f"{dataset_type}_{args.rows}.csv")
+        write_csv(path, args.rows, dataset_type, seed=args.seed, days=args.days)
+        print(f"✅ {args.rows:,} {dataset_type} rows written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from perf import cache_event, start_run, log_run
+
+
+class BackgroundTasks:
+    """
+    Thread pool for long-running analytics (forecasts, anomaly scans) so a
+    rerun never blocks on them. Tasks are keyed: submitting a key that is
+    already running or finished returns the same future, so concurrent
+    users asking for the same series share one fit. Finished tasks are
+    kept for ``max_entries`` keys; failed ones are dropped so they retry.
+    Each task records into its own PerfRun, logged when it finishes and
+    listed by summary().
+    """
+
+    def __init__(self, max_workers: int = 4, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="uidai-task")
+        self._futures = OrderedDict()
+        self._runs = {}
+        self._lock = threading.Lock()
+        self.submitted = self.deduplicated = 0
+
+    def submit(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self._futures.move_to_end(key)
+                self.deduplicated += 1
+                cache_event('background_task', True)
+                return future
+            future = self._executor.submit(self._run, key, fn, args, kwargs)
+            self._futures[key] = future
+            self.submitted += 1
+            cache_event('background_task', False)
+            self._evict()
+        return future
+
+    def _run(self, key, fn, args, kwargs):
+        # Pool threads are reused: a fresh run per task, dropped afterwards
+        run = start_run()
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            log_run(run, task=_task_name(key))
+            with self._lock:
+                if key in self._futures:
+                    self._runs[key] = (run, seconds)
+            start_run()
+
+    def get(self, key):
+        """The future of a submitted key, or None"""
+        with self._lock:
+            return self._futures.get(key)
+
+    def run(self, key, fn, *args, wait_seconds: float = 0.2, **kwargs):
+        """Submit, then give the task ``wait_seconds`` to finish (cache hits usually do)"""
+        future = self.submit(key, fn, *args, **kwargs)
+        wait([future], timeout=wait_seconds)
+        return future
+
+    def pending(self):
+        with self._lock:
+            return sum(not f.done() for f in self._futures.values())
+
+    def summary(self):
+        """Status, wall time and cache counters of every kept task, newest first"""
+        rows = []
+        with self._lock:
+            for key, future in reversed(self._futures.items()):
+                run, seconds = self._runs.get(key, (None, None))
+                status = 'running' if not future.done() else 'failed' if future.exception() else 'done'
+                rows.append({'task': _task_name(key), 'status': status, 'seconds': seconds,
+                             'cache_hits': sum(run.hits.values()) if run else None,
+                             'cache_misses': sum(run.misses.values()) if run else None})
+        return rows
+
+    def _evict(self):
+        # Only finished tasks are evicted; running ones must stay findable
+        excess = len(self._futures) - self.max_entries
+        for key in [k for k, f in self._futures.items() if f.done()][:max(excess, 0)]:
+            del self._futures[key]
+            self._runs.pop(key, None)
+
+
+def _task_name(key):
+    return str(key[0] if isinstance(key, tuple) and key else key)
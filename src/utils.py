@@ -1,4 +1,7 @@
 import streamlit as st
+import pandas as pd
+
+from perf import timed, current_run, summary
 
 def inject_css(path: str):
     try:
@@ -12,6 +15,46 @@ def kpi_row(metrics):
     for col, (label, value) in zip(cols, metrics):
         col.metric(label, value)
 
-@st.cache_data(show_spinner=False)
-def cache_df(df):
-    return df.copy()
+def show_chart(fig):
+    # Includes Plotly's JSON serialisation, which dominates large figures
+    with timed("render.plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+
+def perf_panel(run=None, tasks=None):
+    """Sidebar table of this rerun's stage timings and cache hits, plus background tasks"""
+    run = run or current_run()
+    with st.sidebar.expander("🧪 Performance", expanded=True):
+        stages = pd.DataFrame(summary(run))
+        if len(stages):
+            stages['stage'] = ["· " * d + s for d, s in zip(stages['depth'], stages['stage'])]
+            st.dataframe(stages.drop(columns='depth').round(3), hide_index=True)
+        caches = pd.DataFrame(run.cache_table())
+        if len(caches):
+            st.dataframe(caches, hide_index=True)
+        background = pd.DataFrame(tasks.summary() if tasks is not None else [])
+        if len(background):
+            st.caption("Background tasks")
+            st.dataframe(background.round(3), hide_index=True)
+
+def background_panel(tasks, key, compute, render, message="⏳ Computing in the background...", poll_seconds=1.0):
+    """
+    Run ``compute`` on the shared BackgroundTasks and draw its result with
+    ``render``. While it runs the panel is a fragment polling every
+    ``poll_seconds``, so the rest of the page renders meanwhile; once done
+    one full rerun redraws it without polling.
+    """
+    future = tasks.run(key, compute)
+    pending = not future.done()
+
+    def panel(pending):
+        if not future.done():
+            st.info(message)
+            return
+        if pending:
+            st.rerun()
+        if future.exception() is not None:
+            st.error(f"❌ {future.exception()}")
+            return
+        render(future.result())
+
+    st.fragment(run_every=poll_seconds if pending else None)(panel)(pending)